@@ -0,0 +1,115 @@
+"""Cost of the automod stage on on_message, on a synthetic message stream.
+
+Runs the same stream through on_message with automod disabled everywhere, with
+automod enabled in every guild (invites, links, a 200-word block list and spam
+buckets), and from a guild without automod while the others have it on, then
+times AutoMod.inspect on its own against a naive scan of the
+word list. Command invocation and automod enforcement (Discord API calls) are
+replaced with no-ops so only the per-message checks are measured.
+
+    python benchmarks/bench_automod.py [messages]
+"""
+import asyncio
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='xecura-bench-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+GUILDS = 50
+WORDS = ['hello', 'lol', 'anyone', 'here', 'gg', 'what', 'is', 'the', 'plan', 'tonight', 'ok', 'nice', 'thanks']
+EXTRAS = ['https://example.com/page', 'discord.gg/abcdef', 'badword17', 'x!ping', 'x!help']
+
+
+def block_list(rng: random.Random, count: int = 200) -> list:
+    return sorted({''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))) for _ in range(count)} | {'badword17'})
+
+
+def make_stream(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    authors = [SimpleNamespace(id=user_id, bot=False) for user_id in range(10_000, 12_000)]
+    guilds = [SimpleNamespace(id=guild_id, shard_id=0) for guild_id in range(1, GUILDS + 1)]
+    stream = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 15))]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(EXTRAS))
+        stream.append(SimpleNamespace(
+            content=' '.join(words), author=rng.choice(authors), guild=rng.choice(guilds), _state=main.bot._connection
+        ))
+    return stream
+
+
+async def run(stream) -> float:
+    started = time.perf_counter()
+    for message in stream:
+        await main.on_message(message)
+    return len(stream) / (time.perf_counter() - started)
+
+
+def time_inspect(stream, inspect) -> float:
+    started = time.perf_counter()
+    for message in stream:
+        inspect(message)
+    return (time.perf_counter() - started) / len(stream) * 1e6
+
+
+async def main_async(count: int):
+    bot = main.bot
+    bot._connection.user = SimpleNamespace(id=1)
+
+    async def invoke(ctx):
+        pass
+
+    async def enforce(message, rule):
+        return True
+
+    bot.invoke = invoke
+    main.auto_mod.enforce = enforce
+
+    rng = random.Random(2)
+    stream = make_stream(count)
+    baseline = await run(stream)
+
+    words = block_list(rng)
+    settings = main.DEFAULT_AUTOMOD_SETTINGS._replace(enabled=True, links=True, spam_rate=1_000_000, spam_per=1.0)
+    for guild_id in range(1, GUILDS + 1):
+        main.auto_mod.settings[guild_id] = settings
+        main.auto_mod.words[guild_id] = set(words)
+        main.auto_mod._compile(guild_id)
+    with_automod = await run(stream)
+    outsider = SimpleNamespace(id=GUILDS + 1, shard_id=0)
+    unfiltered = await run([SimpleNamespace(**{**vars(message), 'guild': outsider}) for message in stream])
+
+    compiled_us = time_inspect(stream, main.auto_mod.inspect)
+    invite = re.compile(main._INVITE_PATTERN, re.IGNORECASE)
+
+    def naive(message):
+        content = message.content.lower()
+        if invite.search(content) or 'https://' in content or 'http://' in content:
+            return 'link'
+        tokens = content.split()
+        return next(('word' for word in words if word in tokens), None)
+
+    naive_us = time_inspect(stream, naive)
+    violations = sum(main.auto_mod.inspect(message) is not None for message in stream)
+
+    print(f'messages:              {count} ({violations} violations)')
+    print(f'on_message, no automod: {baseline:,.0f} msg/s')
+    print(f'on_message, automod:    {with_automod:,.0f} msg/s')
+    print(f'added per message:      {(1 / with_automod - 1 / baseline) * 1e6:.2f} us')
+    print(f'on_message, unfiltered: {unfiltered:,.0f} msg/s (guild without automod)')
+    print(f'added per message:      {(1 / unfiltered - 1 / baseline) * 1e6:.2f} us')
+    print(f'AutoMod.inspect:        {compiled_us:.2f} us/msg')
+    print(f'naive word scan:        {naive_us:.2f} us/msg')
+
+
+if __name__ == '__main__':
+    asyncio.run(main_async(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,99 @@
+"""Messages/sec through on_message's command dispatch on a synthetic message stream.
+
+Compares the previous on_message logic (get_context for every message, plus a
+second pass for no-prefix commands) against CommandDispatcher. Command
+invocation itself is replaced with a no-op so only parsing and context
+construction are measured.
+
+    python benchmarks/bench_dispatch.py [messages]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='xecura-bench-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+WORDS = ['hello', 'lol', 'anyone', 'here', 'gg', 'what', 'is', 'the', 'plan', 'tonight', 'ok', 'nice', 'thanks']
+
+
+def make_stream(count: int, no_prefix_ids: set, seed: int = 1):
+    rng = random.Random(seed)
+    commands = sorted(main.bot.all_commands)
+    authors = list(no_prefix_ids) + list(range(10_000, 10_100))
+    stream = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            content = f'{main.DEFAULT_PREFIX}{rng.choice(commands)} {rng.choice(WORDS)}'
+        elif roll < 0.08:
+            content = f'{rng.choice(commands)} {rng.choice(WORDS)}'
+        elif roll < 0.10:
+            content = ''  # attachment-only message
+        else:
+            content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        author = SimpleNamespace(id=rng.choice(authors), bot=False)
+        guild = SimpleNamespace(id=rng.randint(1, 50))
+        stream.append(SimpleNamespace(content=content, author=author, guild=guild, _state=main.bot._connection))
+    return stream
+
+
+async def legacy_on_message(message):
+    bot = main.bot
+    if str(message.author.id) in no_prefix_strings:
+        ctx = await bot.get_context(message)
+        if ctx.command is None:
+            words = message.content.split()
+            command = bot.get_command(words[0].lower()) if words else None
+            if command:
+                message.content = f'{main.DEFAULT_PREFIX}{message.content}'
+                await bot.get_context(message)
+                return
+        await bot.get_context(message)
+    else:
+        await bot.get_context(message)
+
+
+async def run(handler, stream) -> float:
+    started = time.perf_counter()
+    for message in stream:
+        await handler(message)
+    return len(stream) / (time.perf_counter() - started)
+
+
+async def main_async(count: int):
+    bot = main.bot
+    bot._connection.user = SimpleNamespace(id=1)
+
+    async def invoke(ctx):
+        pass
+
+    bot.invoke = invoke
+
+    no_prefix_ids = set(range(100, 150))
+    for user_id in no_prefix_ids:
+        main.data_manager.no_prefix_users.add(user_id)
+    global no_prefix_strings
+    no_prefix_strings = {str(user_id) for user_id in no_prefix_ids}
+
+    stream = make_stream(count, no_prefix_ids)
+    legacy_stream = [SimpleNamespace(content=m.content, author=m.author, guild=m.guild, _state=m._state) for m in stream]
+
+    legacy_rate = await run(legacy_on_message, legacy_stream)
+    dispatch_rate = await run(bot.dispatcher.dispatch, stream)
+    print(f'messages:           {count}')
+    print(f'legacy on_message:  {legacy_rate:,.0f} msg/s')
+    print(f'CommandDispatcher:  {dispatch_rate:,.0f} msg/s')
+    print(f'speedup:            {dispatch_rate / legacy_rate:.1f}x')
+
+
+no_prefix_strings = set()
+
+if __name__ == '__main__':
+    asyncio.run(main_async(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
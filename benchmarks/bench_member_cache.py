@@ -0,0 +1,95 @@
+"""Memory held by the member cache in full and low-memory (XECURA_LOW_MEMORY) modes.
+
+Feeds the same synthetic guild payloads, as received in GUILD_CREATE or member
+chunks, through discord.py with the default member cache and with the cache
+disabled, then fills the low-memory mode's LRU of fetched members the way
+commands would. Reports memory still held afterwards and ingest time for each
+(times include tracemalloc overhead, so compare them only with each other).
+
+    python benchmarks/bench_member_cache.py [guilds] [members_per_guild]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='xecura-bench-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+
+import main  # noqa: E402
+
+
+def member_payload(user_id: int) -> dict:
+    return {
+        'user': {'id': str(user_id), 'username': f'user{user_id}', 'discriminator': '0', 'global_name': None, 'avatar': None},
+        'roles': [],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def guild_payload(guild_id: int, members: int) -> dict:
+    base = guild_id * 1_000_000
+    return {
+        'id': str(guild_id),
+        'name': f'guild {guild_id}',
+        'owner_id': str(base),
+        'member_count': members,
+        'roles': [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'members': [member_payload(base + index) for index in range(members)],
+        'channels': [],
+        'emojis': [],
+        'stickers': [],
+        'features': [],
+    }
+
+
+def measure(label: str, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    kept = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'{label:<34} {current / 1024 / 1024:8.1f} MiB  {elapsed:6.2f}s')
+    return kept
+
+
+def ingest(flags: discord.MemberCacheFlags, payloads: list):
+    client = discord.Client(intents=main.intents, member_cache_flags=flags, chunk_guilds_at_startup=False)
+    state = client._connection
+    return [discord.Guild(data=payload, state=state) for payload in payloads]
+
+
+def fill_lru(guilds: list, payloads: list):
+    cache = main.MemberCache(main.MEMBER_CACHE_SIZE, main.MEMBER_CACHE_TTL)
+    for guild, payload in zip(guilds, payloads):
+        for data in payload['members'][:main.MEMBER_CACHE_SIZE // len(guilds) + 1]:
+            cache.put(discord.Member(data=data, guild=guild, state=guild._state))
+    return cache
+
+
+def main_bench(guild_count: int, members: int):
+    payloads = [guild_payload(guild_id, members) for guild_id in range(1, guild_count + 1)]
+    print(f'{guild_count} guilds x {members} members = {guild_count * members:,} members\n')
+    full = measure('full member cache', lambda: ingest(discord.MemberCacheFlags.all(), payloads))
+    cached = sum(len(guild.members) for guild in full)
+    del full
+    lean = measure('low-memory mode', lambda: ingest(discord.MemberCacheFlags.none(), payloads))
+    lru = measure(f'  + LRU of {main.MEMBER_CACHE_SIZE} fetched members', lambda: fill_lru(lean, payloads))
+    print(f'\ncached members: full={cached:,} low-memory={sum(len(guild.members) for guild in lean):,} lru={len(lru.cache):,}')
+
+
+if __name__ == '__main__':
+    main_bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    )
@@ -2,14 +2,30 @@ import discord
 from discord.ext import commands
 from discord import app_commands, Interaction, SelectOption, PartialEmoji, Embed
 from discord.ui import Select, View
+from discord.ext.commands.view import StringView
 import traceback
+import gzip
+import html
+import tempfile
 import json
+import hashlib
+import contextlib
 import os
 import asyncio
 import platform
+import math
+import re
+import shlex
+import fnmatch
 import datetime
 import sqlite3
-from typing import Optional
+import time
+import bisect
+import heapq
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 
 
 # Initialize bot configuration
@@ -23,7 +39,253 @@ TOKEN = os.getenv('BOT_TOKEN')
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix=DEFAULT_PREFIX, intents=intents, help_command=None)
+
+def parse_shard_ids(text: str) -> Optional[list]:
+    """Parse ``0-3,8`` into ``[0, 1, 2, 3, 8]``. Returns None for an empty string."""
+    if not text.strip():
+        return None
+    shard_ids = []
+    for part in text.split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+# Sharding: XECURA_SHARDED=1 lets discord.py pick the shard count. To split shards
+# across processes, give every process the same XECURA_SHARD_COUNT and its own
+# XECURA_SHARD_IDS range; all of them share one database.
+SHARD_COUNT = int(os.getenv('XECURA_SHARD_COUNT', '0')) or None
+SHARD_IDS = parse_shard_ids(os.getenv('XECURA_SHARD_IDS', ''))
+SHARDED = os.getenv('XECURA_SHARDED', '0').lower() in ('1', 'true', 'yes') or SHARD_COUNT is not None
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise RuntimeError('XECURA_SHARD_IDS requires XECURA_SHARD_COUNT')
+# How often a process running part of the shards reloads badges and no-prefix users saved by the others
+GLOBAL_DATA_REFRESH = int(os.getenv('XECURA_GLOBAL_REFRESH', '30'))
+
+# Low-memory mode keeps no members cached and fetches them when a command needs one
+LOW_MEMORY = os.getenv('XECURA_LOW_MEMORY', '0').lower() in ('1', 'true', 'yes')
+MEMBER_CACHE_SIZE = int(os.getenv('XECURA_MEMBER_CACHE_SIZE', '5000'))
+MEMBER_CACHE_TTL = float(os.getenv('XECURA_MEMBER_CACHE_TTL', '120'))  # seconds
+
+def guild_shard_filter(column: str = 'guild_id') -> str:
+    """SQL condition selecting rows for guilds on this process's shards (always true when it runs them all)."""
+    if SHARD_IDS is None:
+        return '1'
+    return f'(({column} >> 22) % {SHARD_COUNT}) IN ({", ".join(map(str, SHARD_IDS))})'
+
+_FIRST_WORD = re.compile(r'\S+')
+
+class CommandDispatcher:
+    """Single-pass command parsing for on_message.
+
+    The first word after the prefix is looked up in a table of every command name
+    and alias, built once and rebuilt only when commands are added or removed.
+    Plain chat is rejected without building a Context, and a command message gets
+    exactly one Context. No-prefix users may omit the prefix; their lookups are
+    case-insensitive, as before.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._index = None
+
+    def invalidate(self):
+        self._index = None
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            self._index = {name.lower(): command for name, command in self.bot.all_commands.items()}
+        return self._index
+
+    def prefixes_for(self, message: discord.Message) -> tuple:
+        return prefix_manager.prefixes_for(message)
+
+    def parse(self, content: str, prefixes: tuple, no_prefix: bool):
+        """Return ``(prefix, invoked_with, command)`` for a command message, else None.
+
+        ``command`` is None for a prefixed message naming an unknown command, so the
+        usual CommandNotFound handling still runs.
+        """
+        for prefix in prefixes:
+            if content.startswith(prefix):
+                word = _FIRST_WORD.match(content, len(prefix))
+                if word is None or word.start() != len(prefix):
+                    return None
+                invoker = word.group()
+                return prefix, invoker, self.bot.all_commands.get(invoker)
+        if not no_prefix:
+            return None
+        word = _FIRST_WORD.match(content)
+        if word is None:
+            return None
+        invoker = word.group()
+        command = self.index.get(invoker.lower())
+        if command is None:
+            return None
+        return '', invoker, command
+
+    async def dispatch(self, message: discord.Message) -> bool:
+        """Invoke the command in ``message``, if any. Returns whether it was a command."""
+        content = message.content
+        if not content:
+            return False
+        no_prefix = message.author.id in data_manager.no_prefix_users
+        parsed = self.parse(content, self.prefixes_for(message), no_prefix)
+        if parsed is None:
+            return False
+        prefix, invoker, command = parsed
+        view = StringView(content)
+        view.previous = len(prefix)
+        view.index = len(prefix) + len(invoker)
+        ctx = commands.Context(
+            prefix=prefix, view=view, bot=self.bot, message=message,
+            invoked_with=invoker, command=command
+        )
+        await self.bot.invoke(ctx)
+        return True
+
+# label -> (dropdown description, dropdown emoji, page description)
+HELP_CATEGORIES = {
+    'General': ('General utility commands', '<:help:1345381592335646750>', 'Here are the general utility commands:'),
+    'Profile': ('Profile and badge commands', '<:profile1:1389287397761745039>', 'Manage your profile and badges:'),
+    'Moderation': ('Server moderation commands', '<:kick:1345360371002900550>', 'Server moderation commands:'),
+    'Utility': ('Additional utility commands', '<:role1:1389607749985370255>', 'Additional utility commands:'),
+    'Antinuke': ('Server protection commands', '<:antinuke1:1389284381247410287>', 'Server protection commands:'),
+    'Tickets': ('Ticket system commands', '<:ticket1:1389284016099950693>', 'Ticket system commands:'),
+    'Admin': ('Owner-only commands', '<:badge1:1389589621872136293>', 'Owner-only administrative commands:'),
+}
+
+def require_permissions(**perms):
+    """``commands.has_permissions`` that also records the permissions for the help pages."""
+    predicate = commands.has_permissions(**perms).predicate
+    predicate.required_permissions = perms
+    return commands.check(predicate)
+
+def command_permissions(command: commands.Command) -> list:
+    """Names of the permissions a command requires, from ``extras`` or its require_permissions checks."""
+    if 'permissions' in command.extras:
+        return [command.extras['permissions']]
+    names = []
+    for check in command.checks:
+        perms = getattr(check, 'required_permissions', None) or {}
+        names.extend(name.replace('_', ' ').title().replace('Guild', 'Server') for name, value in perms.items() if value)
+    return names
+
+class HelpPages:
+    """Help menu pages generated from the registered commands.
+
+    Each command carries its category and emoji in ``extras`` and its description
+    in ``brief``; usage and required permissions come from the command itself.
+    Pages are built once into embed dicts and rebuilt only when commands are added
+    or removed, so a dropdown click is a lookup and the menu cannot drift from
+    the real command list.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._pages = None
+
+    def invalidate(self):
+        self._pages = None
+
+    def _field(self, command: commands.Command) -> dict:
+        usage = command.usage if command.usage is not None else command.signature
+        name = f'{command.extras.get("emoji", "")} `{command.name}{" " + usage if usage else ""}`'.strip()
+        value = command.brief or command.short_doc or 'No description'
+        permissions = command_permissions(command)
+        if permissions:
+            value += f'\n*Requires {", ".join(permissions)}*'
+        return {'name': name[:256], 'value': value[:1024], 'inline': False}
+
+    def _build(self) -> dict:
+        fields = {category: [] for category in HELP_CATEGORIES}
+        # all_commands keeps registration order but lists aliases too
+        for command in dict.fromkeys(self.bot.all_commands.values()):
+            category = command.extras.get('category')
+            if category in fields and not command.hidden:
+                fields[category].append(self._field(command))
+        total = len(self.bot.commands)
+        return {
+            category: {
+                'type': 'rich',
+                'color': discord.Color.blue().value,
+                'description': HELP_CATEGORIES[category][2],
+                # A tuple, so edits to a rendered embed never reach the cached page
+                'fields': tuple(fields[category][:25]),
+                'footer': {'text': f'Total Commands: {total}'},
+            }
+            for category in HELP_CATEGORIES
+        }
+
+    @property
+    def pages(self) -> dict:
+        if self._pages is None:
+            self._pages = self._build()
+        return self._pages
+
+    def render(self, category: str, guild: Optional[discord.Guild]) -> Embed:
+        page = self.pages[category]
+        embed = Embed.from_dict(page)
+        # set_author/set_footer replace the dicts they touch rather than editing the cached ones
+        embed.set_author(name=f'{category} Commands', icon_url=guild.icon.url if guild and guild.icon else None)
+        embed.set_footer(text=f'Prefix: {prefix_manager.primary(guild)} | {page["footer"]["text"]}')
+        return embed
+
+class XecuraBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    def __init__(self, *args, **kwargs):
+        # Set before super().__init__, which may already register commands
+        self.dispatcher = CommandDispatcher(self)
+        self.help_pages = HelpPages(self)
+        super().__init__(*args, **kwargs)
+
+    def add_command(self, command):
+        super().add_command(command)
+        self.dispatcher.invalidate()
+        self.help_pages.invalidate()
+
+    def remove_command(self, name):
+        command = super().remove_command(name)
+        self.dispatcher.invalidate()
+        self.help_pages.invalidate()
+        return command
+
+    async def setup_hook(self):
+        # Runs once before connecting, unlike on_ready which fires on every reconnect
+        await data_manager.load()
+        await prefix_manager.load()
+        await antinuke_manager.load()
+        await ticket_manager.load()
+        await snapshot_manager.load()
+        await join_guard.load()
+        await action_scheduler.load()
+        await warning_ledger.load()
+        await auto_mod.load()
+        self.add_dynamic_items(TicketPanelButton, TicketCloseButton)
+        try:
+            await command_sync.sync(self)
+        except Exception as e:
+            print(f'[ERROR] Failed to sync slash commands: {str(e)}')
+        data_manager.start_auto_save()
+        snapshot_manager.start()
+        action_scheduler.start()
+        shard_monitor.start()
+        guild_stats.start()
+
+    async def close(self):
+        try:
+            await data_manager.save()
+        except Exception as e:
+            print(f'[ERROR] Final save failed: {str(e)}')
+        await super().close()
+        data_manager.db.close()
+
+def get_prefix(bot, message):
+    return list(prefix_manager.prefixes_for(message))
+
+shard_options = {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS} if SHARD_COUNT else {}
+# The members intent stays on so join/leave events still arrive; only the cache is skipped
+cache_options = {'member_cache_flags': discord.MemberCacheFlags.none(), 'chunk_guilds_at_startup': False} if LOW_MEMORY else {}
+bot = XecuraBot(command_prefix=get_prefix, intents=intents, help_command=None, **shard_options, **cache_options)
 
 # Define available badges
 BADGES = {
@@ -40,6 +302,415 @@ BADGES = {
 # Get data directory from environment variable or use current directory as fallback
 DATA_DIR = os.getenv('XECURA_DATA_DIR', os.getcwd())
 
+# Lazy mode resolves badges on demand through a bounded cache instead of loading every row at startup
+LAZY_USER_DATA = os.getenv('XECURA_LAZY_USER_DATA', '0').lower() in ('1', 'true', 'yes')
+USER_CACHE_SIZE = int(os.getenv('XECURA_USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('XECURA_USER_CACHE_TTL', '600'))  # seconds
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry and expires entries after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=_MISSING):
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class IdSet:
+    """Compact set of Discord IDs stored as a sorted array of 64-bit integers.
+
+    Costs 8 bytes per ID instead of a string object plus a hash-table slot, with
+    O(log n) membership checks. Accepts IDs as ints or strings.
+    """
+
+    def __init__(self, ids=()):
+        self._ids = array('q', sorted({int(i) for i in ids}))
+
+    def __contains__(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return False
+        index = bisect.bisect_left(self._ids, user_id)
+        return index < len(self._ids) and self._ids[index] == user_id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def add(self, user_id):
+        user_id = int(user_id)
+        index = bisect.bisect_left(self._ids, user_id)
+        if index == len(self._ids) or self._ids[index] != user_id:
+            self._ids.insert(index, user_id)
+
+    def discard(self, user_id):
+        user_id = int(user_id)
+        index = bisect.bisect_left(self._ids, user_id)
+        if index < len(self._ids) and self._ids[index] == user_id:
+            del self._ids[index]
+
+    def nbytes(self) -> int:
+        return self._ids.itemsize * len(self._ids)
+
+class MemberCache:
+    """Members fetched on demand, for when the gateway member cache is off.
+
+    Lookups check discord.py's own cache first, then a bounded LRU of members
+    fetched earlier, and only then ask Discord. Entries expire after ``ttl``
+    seconds since role changes to uncached members are never delivered to us.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = LRUCache(maxsize, ttl)
+
+    def get(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = guild.get_member(user_id)
+        if member is None:
+            member = self.cache.get((guild.id, user_id), None)
+        return member
+
+    def put(self, member: discord.Member):
+        self.cache.put((member.guild.id, member.id), member)
+
+    def invalidate(self, guild_id: int, user_id: int):
+        self.cache.invalidate((guild_id, user_id))
+
+    async def fetch(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = self.get(guild, user_id)
+        if member is None:
+            member = (await self.fetch_many(guild, [user_id])).get(user_id)
+        return member
+
+    async def fetch_many(self, guild: discord.Guild, user_ids) -> dict:
+        """Resolve ``user_ids`` to members, asking Discord for the ones not cached, 100 per request."""
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            member = self.get(guild, user_id)
+            if member is not None:
+                found[user_id] = member
+            else:
+                missing.append(user_id)
+        if guild.chunked:
+            return found  # The cache holds every member, so the rest are not in the guild
+        for start in range(0, len(missing), 100):
+            chunk = missing[start:start + 100]
+            ws = bot._get_websocket(shard_id=guild.shard_id)
+            if ws is None or ws.is_ratelimited():
+                # Fall back to HTTP rather than waiting on the gateway rate limit
+                members = []
+                for user_id in chunk:
+                    try:
+                        members.append(await guild.fetch_member(user_id))
+                    except discord.NotFound:
+                        pass
+            else:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            for member in members:
+                self.put(member)
+                found[member.id] = member
+        return found
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+member_cache = MemberCache(MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL)
+
+class CachedMemberConverter(commands.MemberConverter):
+    """MemberConverter whose on-demand fetches go through ``member_cache``."""
+
+    async def query_member_by_id(self, bot, guild, user_id):
+        return await member_cache.fetch(guild, user_id)
+
+if LOW_MEMORY:
+    # Every discord.Member command parameter resolves through this converter
+    commands.converter.CONVERTER_MAPPING[discord.Member] = CachedMemberConverter
+
+async def iter_guild_members(guild: discord.Guild):
+    """Yield every member of ``guild``, streaming them from Discord when they are not cached."""
+    if guild.chunked:
+        for member in guild.members:
+            yield member
+        return
+    async for member in guild.fetch_members(limit=None):
+        yield member
+
+
+_DURATION_PART = re.compile(r'(\d+)([smhdw])')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_duration(text: str) -> Optional[datetime.timedelta]:
+    """Parse durations like ``30s``, ``10m``, ``1h30m`` or ``2w``. Returns None if invalid."""
+    text = text.strip().lower()
+    if not text or _DURATION_PART.sub('', text):
+        return None
+    seconds = sum(int(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART.findall(text))
+    return datetime.timedelta(seconds=seconds) if seconds else None
+
+class PoolStats:
+    """Outcome counters for a TaskPool run."""
+
+    max_errors = 20
+
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.units = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def record_failure(self, item, error: Exception):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((item, error))
+
+
+_STOP = object()
+
+
+class TaskPool:
+    """Runs one Discord API call per item with at most ``limit`` calls in flight.
+
+    Items may be a plain or an async iterable. They are pulled through a small
+    bounded queue, so long inputs such as a guild's ban list are never held in
+    memory at once. A 429 on any call pauses every worker in the pool for the
+    retry-after period before the call is retried. Concurrent runs on the same
+    pool share its ``limit``.
+    """
+
+    def __init__(self, limit: int = 5, retries: int = 3):
+        self.limit = limit
+        self.retries = retries
+        self._paused_until = 0.0
+        self._slots = None
+
+    async def _wait_if_paused(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _call(self, func, item, stats: PoolStats):
+        for attempt in range(self.retries + 1):
+            await self._wait_if_paused()
+            try:
+                async with self._slots:
+                    result = await func(item)
+                stats.succeeded += 1
+                stats.units += result if isinstance(result, int) else 1
+                return
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    stats.record_failure(item, e)
+                    return
+                retry_after = float(e.response.headers.get('Retry-After', 1))
+            except Exception as e:
+                stats.record_failure(item, e)
+                return
+            if attempt == self.retries:
+                stats.record_failure(item, Exception('Rate limited too many times'))
+                return
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    async def run(self, func, items, progress=None, progress_interval: float = 3.0) -> PoolStats:
+        """Await ``func(item)`` for every item and return the run's counters.
+
+        ``func`` may return how many units of work an item covered (default 1),
+        which is summed into ``PoolStats.units``. ``progress``, if given, is awaited with the running PoolStats every
+        ``progress_interval`` seconds.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        stats = PoolStats()
+        queue = asyncio.Queue(maxsize=self.limit * 2)
+
+        async def feed():
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is _STOP:
+                    return
+                await self._call(func, item, stats)
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_interval)
+                try:
+                    await progress(stats)
+                except Exception as e:
+                    print(f'[DEBUG] Progress update failed: {str(e)}')
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.limit)]
+        reporter = asyncio.create_task(report()) if progress else None
+        try:
+            await feed()
+            for _ in workers:
+                await queue.put(_STOP)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            if reporter:
+                reporter.cancel()
+            stats.finished = time.monotonic()
+        return stats
+
+
+class StatusMessage:
+    """A progress message for long jobs that keeps working past the interaction token.
+
+    For slash invocations ``ctx.send`` returns a followup, and followups are edited
+    through the interaction token, which expires after 15 minutes. When an edit
+    fails on one, the update is posted to the channel instead and later edits go
+    to that message.
+    """
+
+    def __init__(self, ctx: commands.Context, message: discord.Message):
+        self.ctx = ctx
+        self.message = message
+
+    @classmethod
+    async def send(cls, ctx: commands.Context, content: str) -> 'StatusMessage':
+        return cls(ctx, await ctx.send(content))
+
+    async def edit(self, **kwargs):
+        try:
+            await self.message.edit(**kwargs)
+        except discord.HTTPException:
+            if not isinstance(self.message, discord.WebhookMessage):
+                raise
+            self.message = await self.ctx.channel.send(**kwargs)
+
+    async def delete(self):
+        await self.message.delete()
+
+
+class Database:
+    """One long-lived SQLite connection owned by a single worker thread.
+
+    Every query is handed to that thread, so disk I/O never runs on the event loop
+    and the connection is reused instead of reopened for each operation.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='xecura-db')
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, func, args):
+        conn = self._connection()
+        try:
+            result = func(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    def call(self, func, *args):
+        """Run ``func(conn, *args)`` on the database thread and block until it finishes.
+
+        Only meant for startup, before the event loop is running.
+        """
+        return self._executor.submit(self._execute, func, args).result()
+
+    async def run(self, func, *args):
+        """Run ``func(conn, *args)`` on the database thread in a single transaction."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute, func, args)
+
+    def close(self):
+        if self._executor is None:
+            return
+
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._executor.submit(_close).result()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+
 class DataManager:
     def verify_database_access(self) -> bool:
         try:
@@ -50,10 +721,7 @@ class DataManager:
             if not os.access(self.data_dir, os.W_OK):
                 print(f'[ERROR] Data directory is not writable: {self.data_dir}')
                 return False
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT 1')
-                cursor.fetchone()
+            self.db.call(lambda conn: conn.execute('SELECT 1').fetchone())
             if not os.access(self.db_file, os.W_OK):
                 print(f'[ERROR] Database file is not writable: {self.db_file}')
                 return False
@@ -65,8 +733,20 @@ class DataManager:
             return False
 
     def __init__(self):
+        self.lazy = LAZY_USER_DATA
         self.badges = {}
-        self.no_prefix_users = set()
+        self.no_prefix_users = IdSet()
+        # In lazy mode badges live in this cache; unsaved edits stay in _pending_badges until written
+        self.user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        self._pending_badges = {}
+        # Keys changed since the last save; only these rows are written back
+        self._dirty_badges = set()
+        self._dirty_no_prefix = set()
+        self._save_lock = None
+        self._auto_save_task = None
+        self._refresh_task = None
+        # Bumped in the database on every save, so processes sharing data.db notice each other's writes
+        self._version = 0
         self.data_dir = os.getenv('DATA_DIR', os.path.abspath(os.path.join(os.getcwd(), 'data')))
         print(f'[DEBUG] Using data directory: {self.data_dir}')
         try:
@@ -77,6 +757,7 @@ class DataManager:
             raise
         self.db_file = os.path.join(self.data_dir, 'data.db')
         print(f'[DEBUG] Database file path: {self.db_file}')
+        self.db = Database(self.db_file)
         if not self.verify_database_access():
             raise Exception('Database access verification failed')
 
@@ -84,7 +765,7 @@ class DataManager:
         retry_delay = 1  # seconds
         for attempt in range(max_retries):
             try:
-                self.init_database()
+                self.db.call(self.init_database)
                 break
             except Exception as e:
                 if attempt == max_retries - 1:
@@ -93,102 +774,493 @@ class DataManager:
                 time.sleep(retry_delay)
                 retry_delay *= 2
 
-        for attempt in range(max_retries):
+    def start_auto_save(self):
+        if self._auto_save_task is None or self._auto_save_task.done():
+            self._auto_save_task = asyncio.create_task(self._auto_save_loop())
+        # Other processes only exist when this one runs a subset of the shards
+        if SHARD_IDS is not None and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
             try:
-                self.load_data()
-                if self.verify_data_consistency():
-                    break
-                raise Exception('Data consistency check failed')
+                await asyncio.sleep(GLOBAL_DATA_REFRESH)
+                await self.refresh()
             except Exception as e:
-                if attempt == max_retries - 1:
-                    print('[DEBUG] All load attempts failed, initializing empty data')
-                    self.badges = {}
-                    self.no_prefix_users = set()
-                    break
-                print(f'[DEBUG] Data load attempt {attempt + 1} failed, retrying in {retry_delay} seconds...')
-                time.sleep(retry_delay)
-                retry_delay *= 2
+                print(f'[ERROR] Global data refresh failed: {str(e)}')
 
-    async def start_auto_save(self):
-        asyncio.create_task(self._auto_save_loop())
+    def _lock(self) -> asyncio.Lock:
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        return self._save_lock
+
+    async def refresh(self) -> bool:
+        """Reload badges and no-prefix users if another process saved since we last read them.
+
+        Returns True if the data was reloaded. Skipped while this process has unsaved
+        edits; they are saved by the next auto-save and the reload happens after that.
+        """
+        async with self._lock():
+            version = await self.db.run(self._read_version)
+            if version == self._version or self.has_pending_changes():
+                return False
+            badges, no_prefix_users, version = await self.db.run(self._read_all, not self.lazy)
+            if self.has_pending_changes():
+                # Edited while we were reading; the edit would be lost
+                return False
+            self.badges, self.no_prefix_users, self._version = badges, no_prefix_users, version
+            self.user_cache.clear()
+            print(f'[DEBUG] Reloaded global data changed by another process (version {version})')
+            return True
 
     async def _auto_save_loop(self):
         while True:
             try:
                 await asyncio.sleep(300)  # Save every 5 minutes
+                if not self.has_pending_changes():
+                    continue
                 print('[DEBUG] Running auto-save...')
-                self.save_data()
-                if not self.verify_data_consistency():
+                await self.save()
+                if not await self.verify_data_consistency():
                     print('[WARNING] Data consistency check failed after auto-save')
             except Exception as e:
                 print(f'[ERROR] Auto-save failed: {str(e)}')
                 traceback.print_exc()
 
-    def init_database(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS badges (
-                    user_id TEXT PRIMARY KEY,
-                    badges TEXT
-                )
-            ''')
+    def init_database(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS badge_types (
+                badge_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_badges (
+                user_id INTEGER NOT NULL,
+                badge_id INTEGER NOT NULL REFERENCES badge_types (badge_id),
+                PRIMARY KEY (user_id, badge_id)
+            ) WITHOUT ROWID
+        ''')
+        # The primary key already indexes user_id; this one serves "who has badge X"
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_badges_badge ON user_badges (badge_id, user_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS no_prefix_users (
+                user_id TEXT PRIMARY KEY
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS global_data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO global_data_version (id, version) VALUES (0, 0)')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO badge_types (name) VALUES (?)',
+            [(name,) for name in BADGES]
+        )
+        self._migrate_legacy_badges(cursor)
+
+    @staticmethod
+    def _migrate_legacy_badges(cursor: sqlite3.Cursor):
+        """Move rows from the old comma-joined ``badges(user_id, badges)`` table into ``user_badges``."""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'badges'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('SELECT user_id, badges FROM badges')
+        rows = []
+        for user_id, badges_str in cursor.fetchall():
+            for badge in filter(None, (badges_str or '').split(',')):
+                rows.append((int(user_id), badge))
+        cursor.executemany('INSERT OR IGNORE INTO badge_types (name) VALUES (?)', {(badge,) for _, badge in rows})
+        cursor.executemany(
+            'INSERT OR IGNORE INTO user_badges (user_id, badge_id) SELECT ?, badge_id FROM badge_types WHERE name = ?',
+            rows
+        )
+        cursor.execute('DROP TABLE badges')
+        print(f'[DEBUG] Migrated {len(rows)} badges to the user_badges table')
+
+    @staticmethod
+    def _read_version(conn: sqlite3.Connection) -> int:
+        return conn.execute('SELECT version FROM global_data_version WHERE id = 0').fetchone()[0]
+
+    @classmethod
+    def _read_all(cls, conn: sqlite3.Connection, include_badges: bool):
+        cursor = conn.cursor()
+        badges = {}
+        if include_badges:
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS no_prefix_users (
-                    user_id TEXT PRIMARY KEY
-                )
+                SELECT ub.user_id, bt.name
+                FROM user_badges ub JOIN badge_types bt ON bt.badge_id = ub.badge_id
             ''')
-            conn.commit()
+            for user_id, badge in cursor.fetchall():
+                badges.setdefault(str(user_id), set()).add(badge)
+        cursor.execute('SELECT user_id FROM no_prefix_users')
+        no_prefix_users = IdSet(row[0] for row in cursor.fetchall())
+        return badges, no_prefix_users, cls._read_version(conn)
 
-    def load_data(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT user_id, badges FROM badges')
-            for user_id, badges_str in cursor.fetchall():
-                self.badges[user_id] = set(badges_str.split(','))
-            
-            cursor.execute('SELECT user_id FROM no_prefix_users')
-            self.no_prefix_users = set(row[0] for row in cursor.fetchall())
-
-    def save_data(self):
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM badges')
-            cursor.execute('DELETE FROM no_prefix_users')
-            
-            for user_id, badges in self.badges.items():
-                cursor.execute('INSERT INTO badges VALUES (?, ?)', (user_id, ','.join(badges)))
-            
-            for user_id in self.no_prefix_users:
-                cursor.execute('INSERT INTO no_prefix_users VALUES (?)', (user_id,))
-            
-            conn.commit()
+    async def load(self):
+        max_retries = 3
+        retry_delay = 1  # seconds
+        for attempt in range(max_retries):
+            try:
+                self.badges, self.no_prefix_users, self._version = await self.db.run(self._read_all, not self.lazy)
+                self.user_cache.clear()
+                self._pending_badges.clear()
+                self._dirty_badges.clear()
+                self._dirty_no_prefix.clear()
+                if await self.verify_data_consistency():
+                    return
+                raise Exception('Data consistency check failed')
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    print('[DEBUG] All load attempts failed, initializing empty data')
+                    self.badges = {}
+                    self.no_prefix_users = IdSet()
+                    self.user_cache.clear()
+                    self._pending_badges.clear()
+                    self._dirty_badges.clear()
+                    self._dirty_no_prefix.clear()
+                    return
+                print(f'[DEBUG] Data load attempt {attempt + 1} failed, retrying in {retry_delay} seconds...')
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2
+
+    async def get_badges(self, user_id) -> frozenset:
+        """Return a user's badges, going through the LRU cache in lazy mode."""
+        user_id = str(user_id)
+        if not self.lazy:
+            return frozenset(self.badges.get(user_id, ()))
+        pending = self._pending_badges.get(user_id)
+        if pending is not None:
+            return pending
+        badges = self.user_cache.get(user_id)
+        if badges is _MISSING:
+            badges = frozenset(await self.fetch_user_badges(int(user_id)))
+            self.user_cache.put(user_id, badges)
+        return badges
+
+    def _set_badges(self, user_id: str, badges: frozenset):
+        if self.lazy:
+            self._pending_badges[user_id] = badges
+            self.user_cache.put(user_id, badges)
+        elif badges:
+            self.badges[user_id] = set(badges)
+        else:
+            self.badges.pop(user_id, None)
+        self._dirty_badges.add(user_id)
+
+    async def add_badge(self, user_id, badge: str) -> bool:
+        """Give a badge to a user. Returns False if they already had it."""
+        user_id = str(user_id)
+        badges = await self.get_badges(user_id)
+        if badge in badges:
+            return False
+        self._set_badges(user_id, badges | {badge})
+        return True
+
+    async def remove_badge(self, user_id, badge: str) -> bool:
+        """Take a badge away from a user. Returns False if they did not have it."""
+        user_id = str(user_id)
+        badges = await self.get_badges(user_id)
+        if badge not in badges:
+            return False
+        self._set_badges(user_id, badges - {badge})
+        return True
+
+    def toggle_no_prefix(self, user_id: str) -> bool:
+        """Flip a user's no-prefix status. Returns the new status."""
+        if user_id in self.no_prefix_users:
+            self.no_prefix_users.discard(user_id)
+            enabled = False
+        else:
+            self.no_prefix_users.add(user_id)
+            enabled = True
+        self._dirty_no_prefix.add(user_id)
+        return enabled
+
+    def has_pending_changes(self) -> bool:
+        return bool(self._dirty_badges or self._dirty_no_prefix)
+
+    def _take_changes(self):
+        """Snapshot the dirty rows on the event loop so the writer thread never reads live state."""
+        dirty_badges = self._dirty_badges
+        dirty_no_prefix = self._dirty_no_prefix
+        self._dirty_badges = set()
+        self._dirty_no_prefix = set()
+
+        if self.lazy:
+            written = {user_id: self._pending_badges[user_id] for user_id in dirty_badges}
+        else:
+            written = {user_id: self.badges.get(user_id, ()) for user_id in dirty_badges}
+        badge_deletes = [(int(user_id),) for user_id in dirty_badges]
+        badge_inserts = [(int(user_id), badge) for user_id, badges in written.items() for badge in badges]
 
-    def verify_data_consistency(self) -> bool:
+        no_prefix_inserts = []
+        no_prefix_deletes = []
+        for user_id in dirty_no_prefix:
+            if user_id in self.no_prefix_users:
+                no_prefix_inserts.append((user_id,))
+            else:
+                no_prefix_deletes.append((user_id,))
+
+        changes = (badge_deletes, badge_inserts, no_prefix_inserts, no_prefix_deletes)
+        return dirty_badges, dirty_no_prefix, written, changes
+
+    @classmethod
+    def _write_changes(cls, conn: sqlite3.Connection, changes) -> int:
+        badge_deletes, badge_inserts, no_prefix_inserts, no_prefix_deletes = changes
+        cursor = conn.cursor()
+        # Replace each changed user's badge rows wholesale; both statements hit the primary key
+        cursor.executemany('DELETE FROM user_badges WHERE user_id = ?', badge_deletes)
+        cursor.executemany(
+            'INSERT INTO user_badges (user_id, badge_id) SELECT ?, badge_id FROM badge_types WHERE name = ?',
+            badge_inserts
+        )
+        cursor.executemany('INSERT OR REPLACE INTO no_prefix_users VALUES (?)', no_prefix_inserts)
+        cursor.executemany('DELETE FROM no_prefix_users WHERE user_id = ?', no_prefix_deletes)
+        cursor.execute('UPDATE global_data_version SET version = version + 1 WHERE id = 0')
+        return cls._read_version(conn)
+
+    async def save(self):
+        """Write only the rows changed since the last save, in a single transaction.
+
+        Saves requested while another one is in flight wait for it and then commit
+        everything that piled up in one batch.
+        """
+        async with self._lock():
+            if not self.has_pending_changes():
+                return
+            dirty_badges, dirty_no_prefix, written, changes = self._take_changes()
+            try:
+                version = await self.db.run(self._write_changes, changes)
+            except Exception:
+                # Keep the keys dirty so the next save retries them
+                self._dirty_badges |= dirty_badges
+                self._dirty_no_prefix |= dirty_no_prefix
+                raise
+            if version == self._version + 1:
+                # Nobody else wrote since our last read, so memory still matches the database
+                self._version = version
+            if self.lazy:
+                # Drop pending edits that are now on disk, unless they changed again mid-write
+                for user_id, badges in written.items():
+                    if self._pending_badges.get(user_id) is badges:
+                        del self._pending_badges[user_id]
+            print(f'[DEBUG] Saved {len(dirty_badges)} badge and {len(dirty_no_prefix)} no-prefix changes')
+
+    @classmethod
+    def _count_rows(cls, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(DISTINCT user_id) FROM user_badges')
+        db_badge_count = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM no_prefix_users')
+        db_noprefix_count = cursor.fetchone()[0]
+        return db_badge_count, db_noprefix_count, cls._read_version(conn)
+
+    async def verify_data_consistency(self) -> bool:
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM badges')
-                db_badge_count = cursor.fetchone()[0]
-                cursor.execute('SELECT COUNT(*) FROM no_prefix_users')
-                db_noprefix_count = cursor.fetchone()[0]
-                
-                if db_badge_count != len(self.badges) or db_noprefix_count != len(self.no_prefix_users):
-                    print(f'[DEBUG] Data consistency mismatch:\nBadges: DB={db_badge_count}, Memory={len(self.badges)}\nNo-prefix: DB={db_noprefix_count}, Memory={len(self.no_prefix_users)}')
-                    return False
+            db_badge_count, db_noprefix_count, version = await self.db.run(self._count_rows)
+            if self.has_pending_changes():
+                # Unsaved edits make the counts differ legitimately
+                return True
+            if version != self._version:
+                # Another process has saved since our last read; the next refresh picks it up
                 return True
+            if self.lazy:
+                # Only the working set is in memory, so there is no badge count to compare against
+                db_badge_count = len(self.badges)
+            if db_badge_count != len(self.badges) or db_noprefix_count != len(self.no_prefix_users):
+                print(f'[DEBUG] Data consistency mismatch:\nBadges: DB={db_badge_count}, Memory={len(self.badges)}\nNo-prefix: DB={db_noprefix_count}, Memory={len(self.no_prefix_users)}')
+                return False
+            return True
         except Exception as e:
             print(f'[DEBUG] Data consistency check failed: {str(e)}')
             return False
 
+    @staticmethod
+    def _query_user_badges(conn: sqlite3.Connection, user_id: int):
+        cursor = conn.execute('''
+            SELECT bt.name
+            FROM user_badges ub JOIN badge_types bt ON bt.badge_id = ub.badge_id
+            WHERE ub.user_id = ?
+        ''', (user_id,))
+        return {row[0] for row in cursor.fetchall()}
+
+    async def fetch_user_badges(self, user_id: int) -> set:
+        """Read one user's badges straight from the database."""
+        return await self.db.run(self._query_user_badges, user_id)
+
+    @staticmethod
+    def _query_badge_holders(conn: sqlite3.Connection, badge: str, limit: int, offset: int):
+        cursor = conn.execute('''
+            SELECT ub.user_id
+            FROM user_badges ub
+            WHERE ub.badge_id = (SELECT badge_id FROM badge_types WHERE name = ?)
+            ORDER BY ub.user_id
+            LIMIT ? OFFSET ?
+        ''', (badge, limit, offset))
+        return [row[0] for row in cursor.fetchall()]
+
+    async def fetch_badge_holders(self, badge: str, limit: int = 20, offset: int = 0) -> list:
+        """Return a page of user IDs holding ``badge``, using the badge index."""
+        return await self.db.run(self._query_badge_holders, badge, limit, offset)
+
+    @staticmethod
+    def _query_badge_counts(conn: sqlite3.Connection):
+        cursor = conn.execute('''
+            SELECT bt.name, COUNT(ub.user_id)
+            FROM badge_types bt LEFT JOIN user_badges ub ON ub.badge_id = bt.badge_id
+            GROUP BY bt.badge_id
+            ORDER BY bt.badge_id
+        ''')
+        return dict(cursor.fetchall())
+
+    async def fetch_badge_counts(self) -> dict:
+        """Return ``{badge: holder count}`` for every known badge."""
+        return await self.db.run(self._query_badge_counts)
+
+    def cache_stats(self) -> dict:
+        stats = self.user_cache.stats()
+        stats['lazy'] = self.lazy
+        stats['pending'] = len(self._pending_badges)
+        stats['no_prefix_users'] = len(self.no_prefix_users)
+        stats['no_prefix_bytes'] = self.no_prefix_users.nbytes()
+        return stats
+
 # Initialize the data manager instance
 data_manager = DataManager()
 
+class PrefixManager:
+    """Per-guild command prefixes, cached in memory so resolving them never touches disk.
+
+    The whole table is read at startup (only guilds with custom prefixes have
+    rows) and a guild's cache entry is replaced whenever its prefixes change.
+    Mentioning the bot always works as a prefix.
+    """
+
+    max_prefixes = 5
+    max_length = 10
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._cache = {}
+        self._mentions = None
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_prefixes (
+                guild_id INTEGER NOT NULL,
+                prefix TEXT NOT NULL,
+                PRIMARY KEY (guild_id, prefix)
+            ) WITHOUT ROWID
+        ''')
+
+    async def load(self):
+        rows = await self.db.run(lambda conn: conn.execute('SELECT guild_id, prefix FROM guild_prefixes').fetchall())
+        prefixes = {}
+        for guild_id, prefix in rows:
+            prefixes.setdefault(guild_id, []).append(prefix)
+        self._cache = {guild_id: self._ordered(values) for guild_id, values in prefixes.items()}
+
+    @staticmethod
+    def _ordered(prefixes) -> tuple:
+        # Longest first, so 'x!!' is tried before 'x!'
+        return tuple(sorted(prefixes, key=len, reverse=True))
+
+    def get(self, guild_id: Optional[int]) -> tuple:
+        """The guild's own prefixes, or the default prefix."""
+        return self._cache.get(guild_id, (DEFAULT_PREFIX,))
+
+    def primary(self, guild: Optional[discord.Guild]) -> str:
+        prefixes = self.get(guild.id if guild else None)
+        return min(prefixes, key=len)
+
+    def prefixes_for(self, message: discord.Message) -> tuple:
+        if self._mentions is None and bot.user is not None:
+            self._mentions = (f'<@{bot.user.id}> ', f'<@!{bot.user.id}> ')
+        prefixes = self.get(message.guild.id if message.guild else None)
+        return prefixes + self._mentions if self._mentions else prefixes
+
+    async def add(self, guild_id: int, prefix: str):
+        current = self._cache.get(guild_id, (DEFAULT_PREFIX,))
+        # The first custom prefix replaces the implicit default, so keep it explicitly
+        rows = [(guild_id, value) for value in set(current) | {prefix}]
+        await self.db.run(lambda conn: conn.executemany(
+            'INSERT OR IGNORE INTO guild_prefixes (guild_id, prefix) VALUES (?, ?)', rows
+        ))
+        self._cache[guild_id] = self._ordered({value for _, value in rows})
+
+    async def remove(self, guild_id: int, prefix: str):
+        remaining = set(self.get(guild_id)) - {prefix}
+        await self.db.run(lambda conn: conn.execute(
+            'DELETE FROM guild_prefixes WHERE guild_id = ? AND prefix = ?', (guild_id, prefix)
+        ))
+        self._cache[guild_id] = self._ordered(remaining)
+
+    async def reset(self, guild_id: int):
+        await self.db.run(lambda conn: conn.execute('DELETE FROM guild_prefixes WHERE guild_id = ?', (guild_id,)))
+        self._cache.pop(guild_id, None)
+
+prefix_manager = PrefixManager(data_manager.db)
+
+class CommandSync:
+    """Pushes the slash command tree to Discord only when its definitions change.
+
+    A SHA-256 of the tree's JSON payload is kept in ``bot_meta``; a restart with
+    the same commands skips the global sync and its rate limit entirely.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS bot_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    @staticmethod
+    def tree_hash(tree: app_commands.CommandTree) -> str:
+        payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda command: command['name'])
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    async def sync(self, bot: commands.Bot) -> bool:
+        """Sync the global tree if it changed since the last sync. Returns True if it synced."""
+        # Every command assumes a guild, so keep them out of DMs
+        for command in bot.tree.walk_commands():
+            command.guild_only = True
+        key = f'command_tree:{bot.application_id}'
+        digest = self.tree_hash(bot.tree)
+        row = await self.db.run(lambda conn: conn.execute('SELECT value FROM bot_meta WHERE key = ?', (key,)).fetchone())
+        if row and row[0] == digest:
+            print('[DEBUG] Slash commands unchanged, skipping sync')
+            return False
+        synced = await bot.tree.sync()
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO bot_meta (key, value) VALUES (?, ?)', (key, digest)
+        ))
+        print(f'[DEBUG] Synced {len(synced)} slash commands')
+        return True
+
+command_sync = CommandSync(data_manager.db)
+
 @bot.event
 async def on_ready():
     print(f'{bot.user} is ready!')
     await bot.change_presence(activity=discord.Game(name=f"Xecura | x!help"))
-    await data_manager.start_auto_save()
+
+@bot.before_invoke
+async def defer_interaction(ctx):
+    # Slash invocations must be answered within 3 seconds; deferring lets slow
+    # commands reply through ctx.send as they would for a message
+    if ctx.interaction is not None and not ctx.interaction.response.is_done():
+        await ctx.defer()
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -206,8 +1278,15 @@ async def on_command_error(ctx, error):
             color=discord.Color.red()
         )
         await ctx.send(embed=embed)
+    elif isinstance(error, commands.BadArgument):
+        embed = discord.Embed(
+            title='<a:nope1:1389178762020520109> Error',
+            description=str(error),
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
     elif isinstance(error, commands.CommandNotFound):
-        if str(ctx.author.id) not in data_manager.no_prefix_users:
+        if ctx.author.id not in data_manager.no_prefix_users:
             embed = discord.Embed(
                 title='<a:nope1:1389178762020520109> Error',
                 description='Command not found!',
@@ -220,81 +1299,18 @@ async def on_command_error(ctx, error):
 class HelpDropdown(discord.ui.Select):
     def __init__(self):
         options = [
-            discord.SelectOption(label='General', description='General utility commands', emoji='<:help:1345381592335646750>'),
-            discord.SelectOption(label='Profile', description='Profile and badge commands', emoji='<:profile1:1389287397761745039>'),
-            discord.SelectOption(label='Moderation', description='Server moderation commands', emoji='<:kick:1345360371002900550>'),
-            discord.SelectOption(label='Utility', description='Additional utility commands', emoji='<:role1:1389607749985370255>'),
-            discord.SelectOption(label='Antinuke', description='Server protection commands', emoji='<:antinuke1:1389284381247410287>'),
-            discord.SelectOption(label='Tickets', description='Ticket system commands', emoji='<:ticket1:1389284016099950693>'),
-            discord.SelectOption(label='Admin', description='Owner-only commands', emoji='<:badge1:1389589621872136293>')
+            discord.SelectOption(label=label, description=description, emoji=emoji)
+            for label, (description, emoji, _) in HELP_CATEGORIES.items()
         ]
         super().__init__(placeholder='Select a category...', min_values=1, max_values=1, options=options)
 
     async def callback(self, interaction: Interaction):
         try:
-            await interaction.response.defer()
-            
-            category = self.values[0]
-            embed = Embed(color=discord.Color.blue())
-            embed.set_author(name=f'{category} Commands', icon_url=interaction.guild.icon.url if interaction.guild.icon else None)
-
-            if category == 'General':
-                embed.description = "Here are the general utility commands:"
-                embed.add_field(name='<:help:1345381592335646750> `help`', value='Show this help menu', inline=False)
-                embed.add_field(name='<a:ping:1345381376433717269> `ping`', value='Check bot\'s latency', inline=False)
-                embed.add_field(name='<:rinvites:1345380642342572193> `botinfo`', value='View information about the bot', inline=False)
-                embed.add_field(name='<:server1:1389588267808325632> `serverinfo`', value='View information about the server', inline=False)
-                embed.add_field(name='<:profile1:1389287397761745039> `userinfo [user]`', value='View information about a user', inline=False)
-                embed.add_field(name='<:avatar1:1389603923316441199> `avatar [user]`', value='View user\'s avatar', inline=False)
-                embed.add_field(name='<:server1:1389588267808325632> `servericon`', value='View server\'s icon', inline=False)
-                embed.add_field(name='<:members1:1389604287469977691> `members`', value='View server member statistics', inline=False)
-
-            elif category == 'Profile':
-                embed.description = "Manage your profile and badges:"
-                embed.add_field(name='<:profile1:1389287397761745039> `profile [user]`', value='View your or someone else\'s profile', inline=False)
-
-            elif category == 'Moderation':
-                embed.description = "Server moderation commands:"
-                embed.add_field(name='<:kick:1345360371002900550> `kick <user> [reason]`', value='Kick a member from the server', inline=False)
-                embed.add_field(name='<:ban:1345360761236488276> `ban <user> [reason]`', value='Ban a member from the server', inline=False)
-                embed.add_field(name='<:unban:1345361440969724019> `unban <user_id>`', value='Unban a user from the server', inline=False)
-                embed.add_field(name='<a:purge:1345361946324631644> `clear <amount>`', value='Delete a specified number of messages', inline=False)
-                embed.add_field(name='<:timeout:1345362419475546173> `warn <user> [reason]`', value='Warn a member', inline=False)
-                embed.add_field(name='<:slowmode1:1389604723610619984> `slowmode <seconds>`', value='Set channel slowmode', inline=False)
-                embed.add_field(name='<a:nickname1:1389605067622977579> `nickname <user> [new_nick]`', value='Change user\'s nickname', inline=False)
-                embed.add_field(name='<:mute1:1389605413132963951> `mute <user> <duration> [reason]`', value='Timeout a user', inline=False)
-                embed.add_field(name='<:unmute1:1389605655622717551> `unmute <user>`', value='Remove timeout from a user', inline=False)
-
-            elif category == 'Utility':
-                embed.description = "Additional utility commands:"
-                embed.add_field(name='<:role1:1389607749985370255> `role <user> <role>`', value='Add/remove role from user', inline=False)
-                embed.add_field(name='<:invites:1345380333222367285> `createchannel <name> [type]`', value='Create a new channel', inline=False)
-                embed.add_field(name='<:delch1:1389608102583603262> `deletechannel <channel>`', value='Delete a channel', inline=False)
-                embed.add_field(name='<:rinvites:1345380642342572193> `invites`', value='List all server invites', inline=False)
-                embed.add_field(name='<:lock1:1389608483292450827> `lock [channel]`', value='Lock a channel', inline=False)
-                embed.add_field(name='<:unlock1:1389608708073590819> `unlock [channel]`', value='Unlock a channel', inline=False)
-
-            elif category == 'Antinuke':
-                embed.description = "Server protection commands:"
-                embed.add_field(name='<:antinuke1:1389284381247410287> `antinuke <enable/disable>`', value='Enable or disable server protection', inline=False)
-                embed.add_field(name='<:whitelist:1389590639343308896> `whitelist <add/remove/list> [user]`', value='Manage trusted users for antinuke', inline=False)
-
-            elif category == 'Tickets':
-                embed.description = "Ticket system commands:"
-                embed.add_field(name='<:ticket1:1389284016099950693> `setup-tickets`', value='Create the ticket panel', inline=False)
-                embed.add_field(name='<a:setting1:1389590399760334868> `ticket-settings`', value='Configure ticket system settings', inline=False)
-
-            elif category == 'Admin':
-                embed.description = "Owner-only administrative commands:"
-                embed.add_field(name='<:badge1:1389589621872136293> `givebadge <user> <badge>`', value='Give a badge to a user (Available badges: owner, admin, staff, bug_hunter, moderator, vip)', inline=False)
-                embed.add_field(name='<:prefix1:1389181942553116695> `togglenoprefix [user]`', value='Toggle no-prefix mode for a user', inline=False)
-
-            embed.set_footer(text=f'Prefix: {DEFAULT_PREFIX} | Total Commands: {len(bot.commands)}')
-            await interaction.edit_original_response(embed=embed)
-
+            embed = bot.help_pages.render(self.values[0], interaction.guild)
+            await interaction.response.edit_message(embed=embed)
         except Exception as e:
             try:
-                await interaction.followup.send(f'An error occurred while updating the help menu: {str(e)}', ephemeral=True)
+                await interaction.response.send_message(f'An error occurred while updating the help menu: {str(e)}', ephemeral=True)
             except:
                 pass
 
@@ -313,7 +1329,7 @@ class HelpView(View):
         except:
             pass
 
-@bot.command(name='botinfo')
+@bot.hybrid_command(name='botinfo', brief='View information about the bot', extras={'category': 'General', 'emoji': '<:rinvites:1345380642342572193>'})
 async def botinfo(ctx):
     embed = discord.Embed(
         title='<:rinvites:1345380642342572193> Bot Information',
@@ -322,15 +1338,19 @@ async def botinfo(ctx):
     embed.add_field(name='Bot Name', value=bot.user.name, inline=True)
     embed.add_field(name='Bot ID', value=bot.user.id, inline=True)
     embed.add_field(name='Created On', value=bot.user.created_at.strftime('%Y-%m-%d'), inline=True)
-    embed.add_field(name='Servers', value=len(bot.guilds), inline=True)
-    embed.add_field(name='Users', value=len(set(bot.get_all_members())), inline=True)
+    embed.add_field(name='Servers', value=guild_stats.guilds, inline=True)
+    embed.add_field(name='Members', value=guild_stats.members, inline=True)
     embed.add_field(name='Commands', value=len(bot.commands), inline=True)
     embed.add_field(name='Python Version', value=platform.python_version(), inline=True)
     embed.add_field(name='Discord.py Version', value=discord.__version__, inline=True)
+    if SHARDED:
+        shard_id = ctx.guild.shard_id if ctx.guild else 0
+        embed.add_field(name='Shard', value=f'{shard_id} of {bot.shard_count}', inline=True)
+        embed.add_field(name='Shard Health', value='\n'.join(shard_monitor.report(limit=10, include=shard_id))[:1024], inline=False)
     embed.set_thumbnail(url=bot.user.avatar.url if bot.user.avatar else None)
     await ctx.send(embed=embed)
 
-@bot.command(name='serverinfo')
+@bot.hybrid_command(name='serverinfo', brief='View information about the server', extras={'category': 'General', 'emoji': '<:server1:1389588267808325632>'})
 async def serverinfo(ctx):
     guild = ctx.guild
     embed = discord.Embed(
@@ -349,7 +1369,7 @@ async def serverinfo(ctx):
         embed.set_thumbnail(url=guild.icon.url)
     await ctx.send(embed=embed)
 
-@bot.command(name='userinfo')
+@bot.hybrid_command(name='userinfo', usage='[user]', brief='View information about a user', extras={'category': 'General', 'emoji': '<:profile1:1389287397761745039>'})
 async def userinfo(ctx, member: Optional[discord.Member] = None):
     member = member or ctx.author
     roles = [role.mention for role in member.roles[1:]]  # All roles except @everyone
@@ -369,8 +1389,8 @@ async def userinfo(ctx, member: Optional[discord.Member] = None):
     await ctx.send(embed=embed)
 
 
-@bot.command(name='kick')
-@commands.has_permissions(kick_members=True)
+@bot.hybrid_command(name='kick', usage='<user> [reason]', brief='Kick a member from the server', extras={'category': 'Moderation', 'emoji': '<:kick:1345360371002900550>'})
+@require_permissions(kick_members=True)
 async def kick(ctx, member: discord.Member, *, reason=None):
     if member.top_role >= ctx.author.top_role and ctx.author.id != ctx.guild.owner_id:
         embed = discord.Embed(
@@ -398,67 +1418,399 @@ async def kick(ctx, member: discord.Member, *, reason=None):
 
 
 
-@bot.command(name='unban')
-@commands.has_permissions(ban_members=True)
-async def unban(ctx, user_id: int):
-    try:
-        user = await bot.fetch_user(user_id)
-        bans = [ban_entry async for ban_entry in ctx.guild.bans()]
-        for ban_entry in bans:
-            if ban_entry.user.id == user_id:
-                await ctx.guild.unban(user)
-                embed = discord.Embed(
-                    title='<:unban:1345361440969724019> User Unbanned',
-                    description=f'**User:** {user.mention}\n**Moderator:** {ctx.author.mention}',
-                    color=discord.Color.green()
-                )
-                return await ctx.send(embed=embed)
-        
+@bot.hybrid_command(name='unban', usage='<user_id>', brief='Unban a user from the server', extras={'category': 'Moderation', 'emoji': '<:unban:1345361440969724019>'})
+@require_permissions(ban_members=True)
+async def unban(ctx, user_id: str):
+    # Taken as text: slash INTEGER options stop at 2^53, well below real user IDs
+    if not user_id.strip().isdigit():
         embed = discord.Embed(
             title='<a:nope1:1389178762020520109> Error',
-            description='This user is not banned!',
+            description='Please give a valid user ID!',
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        return await ctx.send(embed=embed)
+    user_id = int(user_id.strip())
+    try:
+        # Look up the one ban directly instead of paging through the guild's ban list
+        ban_entry = await ctx.guild.fetch_ban(discord.Object(id=user_id))
     except discord.NotFound:
         embed = discord.Embed(
             title='<a:nope1:1389178762020520109> Error',
-            description='User not found!',
+            description='This user is not banned!',
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        return await ctx.send(embed=embed)
 
-@bot.command(name='clear')
-@commands.has_permissions(manage_messages=True)
-async def clear(ctx, amount: int):
-    if amount <= 0:
+    try:
+        await ctx.guild.unban(ban_entry.user, reason=f'Unbanned by {ctx.author}')
+        await action_scheduler.cancel(ctx.guild.id, user_id, 'unban')
+    except discord.NotFound:
         embed = discord.Embed(
             title='<a:nope1:1389178762020520109> Error',
-            description='Please specify a positive number!',
+            description='This user is not banned!',
             color=discord.Color.red()
         )
         return await ctx.send(embed=embed)
-
+    embed = discord.Embed(
+        title='<:unban:1345361440969724019> User Unbanned',
+        description=f'**User:** {ban_entry.user.mention}\n**Moderator:** {ctx.author.mention}',
+        color=discord.Color.green()
+    )
+    await ctx.send(embed=embed)
+
+_massunban_guilds = set()
+
+@bot.hybrid_command(name='massunban', usage='[reason]', brief='Unban every banned user', extras={'category': 'Moderation', 'emoji': '<:unban:1345361440969724019>'})
+@require_permissions(administrator=True)
+async def massunban(ctx, *, reason=None):
+    if ctx.guild.id in _massunban_guilds:
+        return await ctx.send('<a:nope1:1389178762020520109> A mass unban is already running in this server!')
+    _massunban_guilds.add(ctx.guild.id)
+    reason = reason or f'Mass unban by {ctx.author}'
+    status = await StatusMessage.send(ctx, '<a:time:1345383309458538518> Unbanning everyone...')
+
+    async def unban_entry(ban_entry):
+        await ctx.guild.unban(ban_entry.user, reason=reason)
+
+    async def progress(stats):
+        await status.edit(content=f'<a:time:1345383309458538518> Unbanned {stats.succeeded} users so far ({stats.rate:.1f}/s)...')
+
     try:
-        deleted = await ctx.channel.purge(limit=amount + 1)
+        # Bans are streamed page by page straight into the worker pool
+        stats = await TaskPool(limit=5).run(unban_entry, ctx.guild.bans(limit=None), progress=progress)
+    finally:
+        _massunban_guilds.discard(ctx.guild.id)
+
+    embed = discord.Embed(
+        title='<:unban:1345361440969724019> Mass Unban Complete',
+        description=(
+            f'**Unbanned:** {stats.succeeded}\n**Failed:** {stats.failed}\n'
+            f'**Time:** {stats.elapsed:.1f}s ({stats.rate:.1f}/s)\n**Moderator:** {ctx.author.mention}'
+        ),
+        color=discord.Color.green()
+    )
+    await status.edit(content=None, embed=embed)
+
+# Message purging
+MAX_PURGE = 50000
+_LINK = re.compile(r'https?://|discord(?:\.gg|(?:app)?\.com/invite)/', re.IGNORECASE)
+
+def build_purge_filter(query: str):
+    """Turn ``@user bots contains:"free nitro" glob:!* attachments links`` into a check.
+
+    A message must pass every filter given; several users match any of them.
+    ``glob:`` matches the whole message with ``*``/``?``/``[...]`` wildcards
+    instead of a user regex, which could backtrack for minutes on the event loop.
+    Raises commands.BadArgument for malformed filters.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        raise commands.BadArgument('Unbalanced quotes in filters!')
+    user_ids = set()
+    checks = []
+    for token in tokens:
+        lower = token.lower()
+        target = _BULK_TARGET.fullmatch(token)
+        if target:
+            user_ids.add(int(target.group(1) or target.group(2)))
+        elif lower in ('bot', 'bots'):
+            checks.append(lambda message: message.author.bot)
+        elif lower in ('attachment', 'attachments', 'files'):
+            checks.append(lambda message: bool(message.attachments))
+        elif lower in ('link', 'links'):
+            checks.append(lambda message: _LINK.search(message.content) is not None)
+        elif lower.startswith('contains:') and len(token) > 9:
+            text = lower[9:]
+            checks.append(lambda message, text=text: text in message.content.lower())
+        elif lower.startswith('glob:') and len(token) > 5:
+            if len(token) > 205:
+                raise commands.BadArgument('Glob filters are limited to 200 characters!')
+            # fnmatch compiles wildcards to atomic groups, so matching stays linear
+            pattern = re.compile(fnmatch.translate(lower[5:]))
+            checks.append(lambda message, pattern=pattern: pattern.match(message.content.lower()) is not None)
+        else:
+            raise commands.BadArgument(f'Unknown filter `{token}`. Use mentions/IDs, `bots`, `attachments`, `links`, `contains:<text>` or `glob:<pattern>`')
+    if user_ids:
+        checks.append(lambda message: message.author.id in user_ids)
+    return lambda message: all(check(message) for check in checks)
+
+class ChannelPurge:
+    """Deletes matching messages from a channel's history without buffering it.
+
+    History is streamed newest first. Matches younger than 14 days are deleted
+    in bulk, 100 per request; older ones can only be deleted one at a time and
+    are throttled. Both go through one TaskPool fed by a generator, so at most a
+    couple of batches are in memory however many messages are scanned.
+    """
+
+    bulk_size = 100
+    single_delete_interval = 1.0
+
+    def __init__(self, channel: discord.TextChannel, limit: int, check, before=None):
+        self.channel = channel
+        self.limit = limit
+        self.check = check
+        self.before = before
+        self.scanned = 0
+        self.old = 0
+        # Messages whose deletion failed; PoolStats.failed counts bulk batches as one
+        self.failed = 0
+        # Bulk delete rejects anything older than 14 days; keep a minute of slack
+        self.cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - datetime.timedelta(days=14) + datetime.timedelta(minutes=1))
+
+    async def _work(self):
+        batch = []
+        async for message in self.channel.history(limit=self.limit, before=self.before):
+            self.scanned += 1
+            if not self.check(message):
+                continue
+            if message.id >= self.cutoff:
+                batch.append(message)
+                if len(batch) == self.bulk_size:
+                    yield batch
+                    batch = []
+                continue
+            # History is newest first, so everything from here on is too old for bulk delete
+            if batch:
+                yield batch
+                batch = []
+            self.old += 1
+            yield message
+        if batch:
+            yield batch
+
+    async def _delete(self, item) -> int:
+        try:
+            if isinstance(item, list):
+                await self.channel.delete_messages(item)
+                return len(item)
+            await item.delete()
+        except Exception as e:
+            # TaskPool retries rate limits; anything else is final
+            if not isinstance(e, discord.RateLimited) and getattr(e, 'status', None) != 429:
+                self.failed += len(item) if isinstance(item, list) else 1
+            raise
+        await asyncio.sleep(self.single_delete_interval)
+        return 1
+
+    async def run(self, progress=None) -> PoolStats:
+        return await TaskPool(limit=1).run(self._delete, self._work(), progress=progress)
+
+@bot.hybrid_command(name='clear', description='Delete matching messages among the last `amount`', usage='<amount> [filters]', brief='Delete messages among the last `amount`. Filters: users, `bots`, `attachments`, `links`, `contains:<text>`, `glob:<pattern>`', extras={'category': 'Moderation', 'emoji': '<a:purge:1345361946324631644>'})
+@require_permissions(manage_messages=True)
+async def clear(ctx, amount: int, *, filters: str = ''):
+    if amount <= 0:
         embed = discord.Embed(
-            title='<a:purge:1345361946324631644> Messages Cleared',
-            description=f'Successfully deleted {len(deleted)-1} messages.',
-            color=discord.Color.green()
+            title='<a:nope1:1389178762020520109> Error',
+            description='Please specify a positive number!',
+            color=discord.Color.red()
         )
-        msg = await ctx.send(embed=embed)
-        await asyncio.sleep(3)
-        await msg.delete()
-    except discord.Forbidden:
+        return await ctx.send(embed=embed)
+
+    permissions = ctx.channel.permissions_for(ctx.guild.me)
+    if not (permissions.manage_messages and permissions.read_message_history):
         embed = discord.Embed(
             title='<a:nope1:1389178762020520109> Error',
             description='I do not have permission to delete messages!',
             color=discord.Color.red()
         )
-        await ctx.send(embed=embed)
+        return await ctx.send(embed=embed)
+
+    check = build_purge_filter(filters)
+    purge = ChannelPurge(ctx.channel, min(amount, MAX_PURGE), check, before=ctx.message)
+    if ctx.interaction is None:
+        try:
+            await ctx.message.delete()
+        except discord.HTTPException:
+            pass
+    status = await StatusMessage.send(ctx, '<a:time:1345383309458538518> Clearing messages...')
+
+    async def progress(stats):
+        await status.edit(content=f'<a:time:1345383309458538518> Deleted {stats.units} messages, scanned {purge.scanned}/{purge.limit}...')
+
+    stats = await purge.run(progress=progress)
+    embed = discord.Embed(
+        title='<a:purge:1345361946324631644> Messages Cleared',
+        description=(
+            f'Successfully deleted {stats.units} messages.'
+            + (f'\n{purge.old} were older than 14 days and deleted one by one.' if purge.old else '')
+            + (f'\n{purge.failed} messages could not be deleted.' if purge.failed else '')
+        ),
+        color=discord.Color.green()
+    )
+    await status.edit(content=None, embed=embed)
+    await asyncio.sleep(3)
+    try:
+        await status.delete()
+    except discord.HTTPException:
+        pass
 
-@bot.command(name='warn')
-@commands.has_permissions(kick_members=True)
+# Warnings
+WARN_ESCALATIONS = ('mute', 'kick', 'ban')
+WarningEntry = namedtuple('WarningEntry', ['created_at', 'moderator_id', 'reason'])
+
+class WarningLedger:
+    """Stores warnings and the per-guild escalation ladder.
+
+    Each warning has its own autoincrement ID, so two warns in the same clock
+    tick never collide. The (guild_id, user_id, created_at) index makes counting
+    or paging one member's warnings a range scan of that member's rows only.
+    Escalation thresholds are few and cached in memory.
+    """
+
+    per_page = 10
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.thresholds = {}  # guild_id -> {count: (action, seconds or None)}
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(warnings)')}
+        if columns and 'warning_id' not in columns:
+            # Older tables were keyed on created_at; rebuild them with an ID column
+            conn.execute('DROP INDEX IF EXISTS idx_warnings_guild_recent')
+            conn.execute('ALTER TABLE warnings RENAME TO warnings_old')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS warnings (
+                warning_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                moderator_id INTEGER NOT NULL,
+                reason TEXT
+            )
+        ''')
+        if columns and 'warning_id' not in columns:
+            conn.execute('''
+                INSERT INTO warnings (guild_id, user_id, created_at, moderator_id, reason)
+                SELECT guild_id, user_id, created_at, moderator_id, reason FROM warnings_old ORDER BY created_at
+            ''')
+            conn.execute('DROP TABLE warnings_old')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_warnings_member ON warnings (guild_id, user_id, created_at)')
+        # Covers guild-wide "latest warnings" without touching the table
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_warnings_guild_recent ON warnings (guild_id, created_at, user_id, moderator_id)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS warn_thresholds (
+                guild_id INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                duration REAL,
+                PRIMARY KEY (guild_id, count)
+            ) WITHOUT ROWID
+        ''')
+
+    async def load(self):
+        rows = await self.db.run(lambda conn: conn.execute('SELECT guild_id, count, action, duration FROM warn_thresholds').fetchall())
+        self.thresholds = {}
+        for guild_id, count, action, duration in rows:
+            self.thresholds.setdefault(guild_id, {})[count] = (action, duration)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, guild_id: int, user_ids: list, moderator_id: int, reason: Optional[str]) -> dict:
+        now = time.time()
+        conn.executemany(
+            'INSERT INTO warnings (guild_id, user_id, created_at, moderator_id, reason) VALUES (?, ?, ?, ?, ?)',
+            [(guild_id, user_id, now, moderator_id, reason) for user_id in user_ids]
+        )
+        counts = {}
+        for user_id in user_ids:
+            counts[user_id] = conn.execute(
+                'SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+            ).fetchone()[0]
+        return counts
+
+    async def add(self, guild_id: int, user_id: int, moderator_id: int, reason: Optional[str] = None) -> int:
+        """Record a warning and return the member's new warning count."""
+        counts = await self.db.run(self._insert, guild_id, [user_id], moderator_id, reason)
+        return counts[user_id]
+
+    async def add_many(self, guild_id: int, user_ids: list, moderator_id: int, reason: Optional[str] = None) -> dict:
+        """Record one warning for each of ``user_ids`` in a single transaction."""
+        return await self.db.run(self._insert, guild_id, list(dict.fromkeys(user_ids)), moderator_id, reason)
+
+    async def count(self, guild_id: int, user_id: int) -> int:
+        row = await self.db.run(lambda conn: conn.execute(
+            'SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+        ).fetchone())
+        return row[0]
+
+    async def fetch(self, guild_id: int, user_id: int, page: int = 1) -> list:
+        """Return a page of a member's warnings, newest first."""
+        rows = await self.db.run(lambda conn: conn.execute(
+            'SELECT created_at, moderator_id, reason FROM warnings WHERE guild_id = ? AND user_id = ? '
+            'ORDER BY created_at DESC, warning_id DESC LIMIT ? OFFSET ?',
+            (guild_id, user_id, self.per_page, (page - 1) * self.per_page)
+        ).fetchall())
+        return [WarningEntry(*row) for row in rows]
+
+    async def fetch_recent(self, guild_id: int, page: int = 1) -> list:
+        """Return a page of ``(created_at, user_id, moderator_id)`` for the whole guild, newest first."""
+        return await self.db.run(lambda conn: conn.execute(
+            'SELECT created_at, user_id, moderator_id FROM warnings WHERE guild_id = ? '
+            'ORDER BY created_at DESC LIMIT ? OFFSET ?',
+            (guild_id, self.per_page, (page - 1) * self.per_page)
+        ).fetchall())
+
+    async def clear(self, guild_id: int, user_id: int, number: Optional[int] = None) -> int:
+        """Delete all of a member's warnings, or only the ``number``-th newest one."""
+        def delete(conn):
+            if number is None:
+                return conn.execute('DELETE FROM warnings WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)).rowcount
+            row = conn.execute(
+                'SELECT warning_id FROM warnings WHERE guild_id = ? AND user_id = ? '
+                'ORDER BY created_at DESC, warning_id DESC LIMIT 1 OFFSET ?',
+                (guild_id, user_id, number - 1)
+            ).fetchone()
+            if row is None:
+                return 0
+            return conn.execute('DELETE FROM warnings WHERE warning_id = ?', row).rowcount
+
+        return await self.db.run(delete)
+
+    def get_escalation(self, guild_id: int, count: int):
+        """Return ``(action, seconds)`` configured for exactly ``count`` warnings, or None."""
+        return self.thresholds.get(guild_id, {}).get(count)
+
+    async def set_escalation(self, guild_id: int, count: int, action: Optional[str], duration: Optional[float] = None):
+        if action is None:
+            await self.db.run(lambda conn: conn.execute(
+                'DELETE FROM warn_thresholds WHERE guild_id = ? AND count = ?', (guild_id, count)
+            ))
+            self.thresholds.get(guild_id, {}).pop(count, None)
+            return
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO warn_thresholds (guild_id, count, action, duration) VALUES (?, ?, ?, ?)',
+            (guild_id, count, action, duration)
+        ))
+        self.thresholds.setdefault(guild_id, {})[count] = (action, duration)
+
+    async def escalate(self, member: discord.Member, count: int) -> Optional[str]:
+        """Apply the punishment configured for ``count`` warnings. Returns what was done."""
+        escalation = self.get_escalation(member.guild.id, count)
+        if escalation is None:
+            return None
+        action, duration = escalation
+        reason = f'Reached {count} warnings'
+        length = datetime.timedelta(seconds=duration) if duration else None
+        if action == 'mute':
+            await action_scheduler.schedule_mute(member, length or datetime.timedelta(hours=1), reason=reason)
+            return f'muted for {length or datetime.timedelta(hours=1)}'
+        if action == 'kick':
+            await member.kick(reason=reason)
+            return 'kicked'
+        await member.ban(reason=reason)
+        if length:
+            await action_scheduler.schedule(member.guild.id, member.id, 'unban', time.time() + duration)
+            return f'banned for {length}'
+        await action_scheduler.cancel(member.guild.id, member.id, 'unban')
+        return 'banned'
+
+warning_ledger = WarningLedger(data_manager.db)
+
+@bot.hybrid_command(name='warn', usage='<user> [reason]', brief='Warn a member', extras={'category': 'Moderation', 'emoji': '<:timeout:1345362419475546173>'})
+@require_permissions(kick_members=True)
 async def warn(ctx, member: discord.Member, *, reason=None):
     if member.top_role >= ctx.author.top_role and ctx.author.id != ctx.guild.owner_id:
         embed = discord.Embed(
@@ -468,11 +1820,20 @@ async def warn(ctx, member: discord.Member, *, reason=None):
         )
         return await ctx.send(embed=embed)
 
+    count = await warning_ledger.add(ctx.guild.id, member.id, ctx.author.id, reason)
     embed = discord.Embed(
         title='<:warn1:1389181551358509077> Member Warned',
-        description=f'**Member:** {member.mention}\n**Reason:** {reason or "No reason provided"}\n**Moderator:** {ctx.author.mention}',
+        description=f'**Member:** {member.mention}\n**Reason:** {reason or "No reason provided"}\n**Moderator:** {ctx.author.mention}\n**Warnings:** {count}',
         color=discord.Color.yellow()
     )
+    try:
+        escalation = await warning_ledger.escalate(member, count)
+        if escalation:
+            embed.add_field(name='Escalation', value=f'{member.mention} was {escalation}', inline=False)
+    except discord.Forbidden:
+        embed.add_field(name='Escalation', value='I do not have permission to punish this member!', inline=False)
+    except discord.HTTPException as e:
+        embed.add_field(name='Escalation', value=f'Could not punish this member: {e.text or e.status}', inline=False)
     await ctx.send(embed=embed)
 
     try:
@@ -485,11 +1846,80 @@ async def warn(ctx, member: discord.Member, *, reason=None):
     except discord.Forbidden:
         pass
 
-@bot.command(name='help', aliases=['h'])
+@bot.hybrid_command(name='warnings', usage='[user] [page]', brief="Show a member's warnings, or the server's latest", extras={'category': 'Moderation', 'emoji': '<:timeout:1345362419475546173>'})
+@require_permissions(kick_members=True)
+async def warnings(ctx, member: Optional[discord.Member] = None, page: int = 1):
+    page = max(page, 1)
+    if member is None:
+        rows = await warning_ledger.fetch_recent(ctx.guild.id, page)
+        embed = discord.Embed(
+            title=f'<:warn1:1389181551358509077> Recent Warnings in {ctx.guild.name}',
+            description='\n'.join(f'<t:{int(created_at)}:R> <@{user_id}> by <@{moderator_id}>' for created_at, user_id, moderator_id in rows) or 'No warnings on this page.',
+            color=discord.Color.yellow()
+        )
+        embed.set_footer(text=f'Page {page}')
+        return await ctx.send(embed=embed)
+
+    total = await warning_ledger.count(ctx.guild.id, member.id)
+    pages = max((total + warning_ledger.per_page - 1) // warning_ledger.per_page, 1)
+    rows = await warning_ledger.fetch(ctx.guild.id, member.id, page)
+    start = (page - 1) * warning_ledger.per_page
+    embed = discord.Embed(
+        title=f'<:warn1:1389181551358509077> Warnings for {member}',
+        description='\n'.join(
+            f'**{start + i}.** <t:{int(warning.created_at)}:R> by <@{warning.moderator_id}>: {warning.reason or "No reason provided"}'
+            for i, warning in enumerate(rows, 1)
+        ) or 'No warnings on this page.',
+        color=discord.Color.yellow()
+    )
+    embed.set_footer(text=f'Page {page}/{pages} • {total} warnings')
+    await ctx.send(embed=embed)
+
+@bot.hybrid_command(name='clearwarns', usage='<user> [number]', brief="Remove one or all of a member's warnings", extras={'category': 'Moderation', 'emoji': '<:timeout:1345362419475546173>'})
+@require_permissions(kick_members=True)
+async def clearwarns(ctx, member: discord.Member, number: Optional[int] = None):
+    if number is not None and number < 1:
+        return await ctx.send('<a:nope1:1389178762020520109> Warning number must be 1 or higher!')
+    removed = await warning_ledger.clear(ctx.guild.id, member.id, number)
+    if not removed:
+        return await ctx.send(f'<a:nope1:1389178762020520109> {member.mention} has no matching warnings!')
+    embed = discord.Embed(
+        title='<:tick1:1389181551358509077> Warnings Cleared',
+        description=f'Removed {removed} warning(s) from {member.mention}',
+        color=discord.Color.green()
+    )
+    await ctx.send(embed=embed)
+
+@bot.hybrid_command(name='warnconfig', usage='[count] [mute/kick/ban/none] [duration]', brief='Punish members automatically when they reach a warning count', extras={'category': 'Moderation', 'emoji': '<a:setting1:1389590399760334868>'})
+@require_permissions(administrator=True)
+async def warnconfig(ctx, count: Optional[int] = None, action: Optional[str] = None, duration: Optional[str] = None):
+    if count is not None:
+        if count < 1:
+            return await ctx.send('<a:nope1:1389178762020520109> Warning count must be 1 or higher!')
+        action = (action or 'none').lower()
+        if action not in WARN_ESCALATIONS + ('none',):
+            return await ctx.send(f'<a:nope1:1389178762020520109> Action must be one of: {", ".join(WARN_ESCALATIONS)} or none')
+        length = parse_duration(duration) if duration else None
+        if duration and length is None:
+            return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `1h` or `7d`!')
+        await warning_ledger.set_escalation(ctx.guild.id, count, None if action == 'none' else action, length.total_seconds() if length else None)
+
+    ladder = sorted(warning_ledger.thresholds.get(ctx.guild.id, {}).items())
+    embed = discord.Embed(
+        title='<a:setting1:1389590399760334868> Warning Escalation',
+        description='\n'.join(
+            f'**{count} warnings:** {action}' + (f' for {datetime.timedelta(seconds=int(duration))}' if duration else '')
+            for count, (action, duration) in ladder
+        ) or 'No escalation configured.',
+        color=discord.Color.blue()
+    )
+    await ctx.send(embed=embed)
+
+@bot.hybrid_command(name='help', aliases=['h'], brief='Show this help menu', extras={'category': 'General', 'emoji': '<:help:1345381592335646750>'})
 async def custom_help(ctx):
     embed = discord.Embed(
         title='<:help:1345381592335646750> Xecura Help Menu',
-        description=f'Hello {ctx.author.mention}! Welcome to Xecura Bot!\n\n**About Xecura**\nXecura is a versatile Discord bot that provides moderation, profile management, antinuke protection, and ticket system features.\n\n**Using the Bot**\n• All commands start with `{DEFAULT_PREFIX}` (some users have no-prefix privilege)\n• Use the dropdown menu below to explore different command categories\n• For detailed command usage, include the command in the help menu',
+        description=f'Hello {ctx.author.mention}! Welcome to Xecura Bot!\n\n**About Xecura**\nXecura is a versatile Discord bot that provides moderation, profile management, antinuke protection, and ticket system features.\n\n**Using the Bot**\n• All commands start with `{prefix_manager.primary(ctx.guild)}` (some users have no-prefix privilege)\n• Use the dropdown menu below to explore different command categories\n• For detailed command usage, include the command in the help menu',
         color=ctx.author.color or discord.Color.blue()
     )
     if ctx.guild.icon:
@@ -497,7 +1927,7 @@ async def custom_help(ctx):
     view = HelpView()
     view.message = await ctx.send(embed=embed, view=view)
 
-@bot.command(name='profile')
+@bot.hybrid_command(name='profile', usage='[user]', brief="View your or someone else's profile", extras={'category': 'Profile', 'emoji': '<:profile1:1389287397761745039>'})
 async def profile(ctx, member: Optional[discord.Member] = None):
     member = member or ctx.author
     
@@ -512,7 +1942,7 @@ async def profile(ctx, member: Optional[discord.Member] = None):
     embed.add_field(name='📅 Joined', value=member.joined_at.strftime('%Y-%m-%d'), inline=True)
     
     # Add badges
-    badges = data_manager.badges.get(str(member.id), set())
+    badges = await data_manager.get_badges(member.id)
     badge_display = '\n'.join([BADGES[badge] for badge in badges]) if badges else BADGES['no_badge']
     badge_display = badge_display.replace('👑', '<:owner1:1389180694814654474>')\
                                .replace('🛡️', '<a:staff112:1389180853195771906>')\
@@ -528,12 +1958,12 @@ async def profile(ctx, member: Optional[discord.Member] = None):
     )
     
     # Add no-prefix status
-    no_prefix_status = '<:tick1:1389181551358509077> Enabled' if str(member.id) in data_manager.no_prefix_users else '<a:nope1:1389178762020520109> Disabled'
+    no_prefix_status = '<:tick1:1389181551358509077> Enabled' if member.id in data_manager.no_prefix_users else '<a:nope1:1389178762020520109> Disabled'
     embed.add_field(name='<:prefix1:1389181942553116695> No-Prefix Status', value=no_prefix_status, inline=False)
     
     await ctx.send(embed=embed)
 
-@bot.command(name='togglenoprefix')
+@bot.hybrid_command(name='togglenoprefix', usage='<user>', brief='Toggle no-prefix mode for a user', extras={'category': 'Admin', 'emoji': '<:prefix1:1389181942553116695>', 'permissions': 'Bot owner'})
 async def togglenoprefix(ctx, user: discord.Member):
     try:
         if ctx.author.id != OWNER_ID:  # Compare integers instead of strings
@@ -543,19 +1973,18 @@ async def togglenoprefix(ctx, user: discord.Member):
         user_id = str(user.id)
         await ctx.send('<a:time:1345383309458538518> Toggling no-prefix status...')
 
-        if user_id in data_manager.no_prefix_users:
-            data_manager.no_prefix_users.remove(user_id)
-            action = 'removed from'
-        else:
-            data_manager.no_prefix_users.add(user_id)
+        # Pick up changes saved by other shard processes before editing
+        await data_manager.refresh()
+
+        if data_manager.toggle_no_prefix(user_id):
             action = 'added to'
+        else:
+            action = 'removed from'
 
-        print(f'[DEBUG] Before save - no_prefix_users: {data_manager.no_prefix_users}')
-        data_manager.save_data()
-        print(f'[DEBUG] After save - no_prefix_users: {data_manager.no_prefix_users}')
+        await data_manager.save()
 
         # Verify data was saved correctly
-        if not data_manager.verify_data_consistency():
+        if not await data_manager.verify_data_consistency():
             await ctx.send('⚠️ Warning: Data might not have been saved correctly. Please try again.')
             return
 
@@ -566,130 +1995,1386 @@ async def togglenoprefix(ctx, user: discord.Member):
         traceback.print_exc()
         await ctx.send('❌ An error occurred while processing the command.')
 
+def _legacy_json_paths(filename: str):
+    """Places older versions wrote their JSON files: the process CWD and the data directory."""
+    paths = []
+    for directory in (os.getcwd(), data_manager.data_dir):
+        path = os.path.abspath(os.path.join(directory, filename))
+        if path not in paths and os.path.exists(path):
+            paths.append(path)
+    return paths
+
+def _mark_imported(path: str):
+    try:
+        os.replace(path, path + '.imported')
+    except OSError as e:
+        print(f'[WARNING] Could not rename imported file {path}: {str(e)}')
+
 # Antinuke System
+AntinukeSettings = namedtuple('AntinukeSettings', ['threshold', 'window', 'punishment'])
+ANTINUKE_PUNISHMENTS = ('ban', 'kick', 'strip')
+DEFAULT_ANTINUKE_SETTINGS = AntinukeSettings(threshold=3, window=10.0, punishment='ban')
+
+def _audit_entry_targets(entry: discord.AuditLogEntry, target_id: int) -> bool:
+    if getattr(entry.target, 'id', None) == target_id:
+        return True
+    # Webhook entries target the webhook itself; the channel is recorded in the change set
+    channel = getattr(entry.after, 'channel', None)
+    return getattr(channel, 'id', None) == target_id
+
 class AntinukeManager:
-    def __init__(self):
+    def __init__(self, db: Database):
+        self.db = db
         self.enabled_guilds = set()
         self.whitelisted_users = {}
-        self.load_data()
-    
-    def load_data(self):
+        self.settings = {}
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS antinuke_guilds (
+                guild_id INTEGER PRIMARY KEY
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS antinuke_whitelist (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS antinuke_settings (
+                guild_id INTEGER PRIMARY KEY,
+                threshold INTEGER NOT NULL,
+                window REAL NOT NULL,
+                punishment TEXT NOT NULL
+            )
+        ''')
+
+    @staticmethod
+    def _import_json(conn: sqlite3.Connection, path: str):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        cursor = conn.cursor()
+        cursor.executemany(
+            'INSERT OR IGNORE INTO antinuke_guilds (guild_id) VALUES (?)',
+            [(int(guild_id),) for guild_id in data.get('enabled_guilds', [])]
+        )
+        cursor.executemany(
+            'INSERT OR IGNORE INTO antinuke_whitelist (guild_id, user_id) VALUES (?, ?)',
+            [(int(guild_id), int(user_id)) for guild_id, users in data.get('whitelisted_users', {}).items() for user_id in users]
+        )
+
+    @staticmethod
+    def _read_all(conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('SELECT guild_id FROM antinuke_guilds')
+        enabled_guilds = {row[0] for row in cursor.fetchall()}
+        whitelisted_users = {}
+        cursor.execute('SELECT guild_id, user_id FROM antinuke_whitelist')
+        for guild_id, user_id in cursor.fetchall():
+            whitelisted_users.setdefault(guild_id, set()).add(user_id)
+        cursor.execute('SELECT guild_id, threshold, window, punishment FROM antinuke_settings')
+        settings = {guild_id: AntinukeSettings(threshold, window, punishment) for guild_id, threshold, window, punishment in cursor.fetchall()}
+        return enabled_guilds, whitelisted_users, settings
+
+    async def load(self):
+        for path in _legacy_json_paths('antinuke.json'):
+            await self.db.run(self._import_json, path)
+            _mark_imported(path)
+            print(f'[DEBUG] Imported antinuke settings from {path}')
+        self.enabled_guilds, self.whitelisted_users, self.settings = await self.db.run(self._read_all)
+
+    async def set_enabled(self, guild_id: int, enabled: bool):
+        if enabled:
+            await self.db.run(lambda conn: conn.execute('INSERT OR IGNORE INTO antinuke_guilds (guild_id) VALUES (?)', (guild_id,)))
+            self.enabled_guilds.add(guild_id)
+        else:
+            await self.db.run(lambda conn: conn.execute('DELETE FROM antinuke_guilds WHERE guild_id = ?', (guild_id,)))
+            self.enabled_guilds.discard(guild_id)
+
+    def is_whitelisted(self, guild_id: int, user_id: int) -> bool:
+        return user_id in self.whitelisted_users.get(guild_id, ())
+
+    async def add_whitelist(self, guild_id: int, user_id: int):
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR IGNORE INTO antinuke_whitelist (guild_id, user_id) VALUES (?, ?)', (guild_id, user_id)
+        ))
+        self.whitelisted_users.setdefault(guild_id, set()).add(user_id)
+
+    async def remove_whitelist(self, guild_id: int, user_id: int):
+        await self.db.run(lambda conn: conn.execute(
+            'DELETE FROM antinuke_whitelist WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)
+        ))
+        users = self.whitelisted_users.get(guild_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.whitelisted_users[guild_id]
+
+    def get_settings(self, guild_id: int) -> 'AntinukeSettings':
+        return self.settings.get(guild_id, DEFAULT_ANTINUKE_SETTINGS)
+
+    async def set_settings(self, guild_id: int, settings: 'AntinukeSettings'):
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO antinuke_settings (guild_id, threshold, window, punishment) VALUES (?, ?, ?, ?)',
+            (guild_id, settings.threshold, settings.window, settings.punishment)
+        ))
+        self.settings[guild_id] = settings
+
+antinuke_manager = AntinukeManager(data_manager.db)
+
+
+class RateWindow:
+    """Trips once ``limit`` events land within ``window`` seconds.
+
+    Only the last ``limit`` timestamps are kept, in a fixed-size ring buffer, so
+    recording an event is O(1) no matter how fast events arrive.
+    """
+    __slots__ = ('limit', 'window', '_times', '_index', '_count')
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._times = array('d', bytes(8 * limit))
+        self._index = 0
+        self._count = 0
+
+    def hit(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self._times[self._index] = now
+        self._index = (self._index + 1) % self.limit
+        if self._count < self.limit:
+            self._count += 1
+            if self._count < self.limit:
+                return False
+        # The slot we will overwrite next holds the oldest of the last `limit` events
+        return now - self._times[self._index] <= self.window
+
+
+class AuditLogService:
+    """Attributes guild events to actors while keeping audit log requests to a minimum.
+
+    Recent entries are cached per guild in a bounded deque. Lookups that miss the
+    cache trigger a refresh, and concurrent refreshes for the same guild share one
+    paginated fetch that only asks for entries newer than the last one seen.
+    """
+
+    cache_size = 200
+    page_size = 100
+    max_fetch = 500
+    attribution_window = 15  # seconds between the event and its audit log entry
+    retry_delays = (0, 0.5, 1.5)  # audit log entries can show up shortly after the gateway event
+
+    def __init__(self, manager: AntinukeManager):
+        self.manager = manager
+        self._entries = {}
+        self._inflight = {}
+        self.lookups = 0
+        self.fetches = 0
+
+    def forget(self, guild_id: int):
+        self._entries.pop(guild_id, None)
+
+    def _match(self, guild_id: int, action: discord.AuditLogAction, target_id: int):
+        entries = self._entries.get(guild_id)
+        if not entries:
+            return None
+        cutoff = discord.utils.utcnow() - datetime.timedelta(seconds=self.attribution_window)
+        for entry in reversed(entries):
+            if entry.created_at < cutoff:
+                break
+            if entry.action == action and _audit_entry_targets(entry, target_id):
+                return entry
+        return None
+
+    async def _fetch(self, guild: discord.Guild):
+        self.fetches += 1
+        entries = self._entries.get(guild.id)
+        cutoff = discord.utils.utcnow() - datetime.timedelta(seconds=self.attribution_window)
+        # Entries at or below this ID are already cached and must not be appended again
+        newest_id = entries[-1].id if entries else 0
+        if entries and entries[-1].created_at >= cutoff:
+            # Only page through what happened since the newest entry we already hold
+            fetched = [entry async for entry in guild.audit_logs(limit=self.max_fetch, after=discord.Object(id=newest_id))]
+        else:
+            fetched = [entry async for entry in guild.audit_logs(limit=self.page_size)]
+        if entries is None:
+            entries = self._entries[guild.id] = deque(maxlen=self.cache_size)
+        for entry in sorted(fetched, key=lambda e: e.id):
+            if entry.id > newest_id:
+                entries.append(entry)
+
+    async def _refresh(self, guild: discord.Guild):
+        task = self._inflight.get(guild.id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(guild))
+            self._inflight[guild.id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(guild.id, None))
+        await asyncio.shield(task)
+
+    async def find_actor(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: int):
+        """Return the user who performed ``action`` on ``target_id``, or None if it cannot be attributed."""
+        if guild.id not in self.manager.enabled_guilds:
+            return None
+        self.lookups += 1
+        entry = self._match(guild.id, action, target_id)
         try:
-            with open('antinuke.json', 'r') as f:
-                data = json.load(f)
-                self.enabled_guilds = set(data.get('enabled_guilds', []))
-                self.whitelisted_users = {guild_id: set(users) for guild_id, users in data.get('whitelisted_users', {}).items()}
-        except FileNotFoundError:
-            self.save_data()
-    
-    def save_data(self):
-        with open('antinuke.json', 'w') as f:
-            json_data = {
-                'enabled_guilds': list(self.enabled_guilds),
-                'whitelisted_users': {guild_id: list(users) for guild_id, users in self.whitelisted_users.items()}
+            for delay in self.retry_delays:
+                if entry is not None:
+                    break
+                if delay:
+                    await asyncio.sleep(delay)
+                await self._refresh(guild)
+                entry = self._match(guild.id, action, target_id)
+        except discord.Forbidden:
+            print(f'[WARNING] Missing audit log access in guild {guild.id}')
+        except discord.HTTPException as e:
+            print(f'[WARNING] Audit log fetch failed in guild {guild.id}: {str(e)}')
+        return entry.user if entry is not None else None
+
+audit_log_service = AuditLogService(antinuke_manager)
+
+
+class GuildSnapshotManager:
+    """Keeps a periodically refreshed copy of each protected guild's roles and channels.
+
+    After an incident the snapshot is replayed through a TaskPool: missing roles
+    first, then categories, then the remaining channels, each phase concurrently.
+    """
+
+    refresh_interval = 1800  # seconds
+    incident_cooldown = 600  # don't overwrite a snapshot with a guild that may be mid-nuke
+
+    def __init__(self, manager: AntinukeManager, db: Database):
+        self.manager = manager
+        self.db = db
+        self.snapshots = {}
+        self.last_restore = {}
+        self._incidents = {}
+        self._restoring = set()
+        self._refresh_task = None
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_snapshots (
+                guild_id INTEGER PRIMARY KEY,
+                taken_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        ''')
+
+    async def load(self):
+        rows = await self.db.run(lambda conn: conn.execute('SELECT guild_id, data FROM guild_snapshots').fetchall())
+        self.snapshots = {guild_id: json.loads(data) for guild_id, data in rows}
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        await bot.wait_until_ready()
+        while True:
+            for guild_id in list(self.manager.enabled_guilds):
+                guild = bot.get_guild(guild_id)
+                if guild is None:
+                    continue
+                try:
+                    await self.take(guild)
+                except Exception as e:
+                    print(f'[ERROR] Snapshot of guild {guild_id} failed: {str(e)}')
+                await asyncio.sleep(0)
+            await asyncio.sleep(self.refresh_interval)
+
+    def mark_incident(self, guild_id: int):
+        self._incidents[guild_id] = time.monotonic()
+
+    @staticmethod
+    def _overwrites(channel) -> list:
+        return [
+            {
+                'id': target.id,
+                'type': 'role' if isinstance(target, discord.Role) else 'member',
+                'allow': overwrite.pair()[0].value,
+                'deny': overwrite.pair()[1].value
+            }
+            for target, overwrite in channel.overwrites.items()
+        ]
+
+    def capture(self, guild: discord.Guild) -> dict:
+        roles = [
+            {
+                'id': role.id,
+                'name': role.name,
+                'permissions': role.permissions.value,
+                'color': role.color.value,
+                'hoist': role.hoist,
+                'mentionable': role.mentionable,
+                'position': role.position
+            }
+            for role in guild.roles
+            if not role.is_default() and not role.managed
+        ]
+        channels = []
+        for channel in guild.channels:
+            data = {
+                'id': channel.id,
+                'type': channel.type.name,
+                'name': channel.name,
+                'position': channel.position,
+                'category_id': channel.category_id,
+                'overwrites': self._overwrites(channel)
+            }
+            if isinstance(channel, discord.TextChannel):
+                data.update(topic=channel.topic, nsfw=channel.nsfw, slowmode_delay=channel.slowmode_delay)
+            elif isinstance(channel, discord.VoiceChannel):
+                data.update(bitrate=channel.bitrate, user_limit=channel.user_limit)
+            channels.append(data)
+        return {'taken_at': time.time(), 'roles': roles, 'channels': channels}
+
+    async def take(self, guild: discord.Guild, force: bool = False) -> bool:
+        last_incident = self._incidents.get(guild.id)
+        if not force and last_incident and time.monotonic() - last_incident < self.incident_cooldown:
+            return False
+        snapshot = self.capture(guild)
+        data = json.dumps(snapshot, separators=(',', ':'))
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO guild_snapshots (guild_id, taken_at, data) VALUES (?, ?, ?)',
+            (guild.id, snapshot['taken_at'], data)
+        ))
+        self.snapshots[guild.id] = snapshot
+        return True
+
+    def forget(self, guild_id: int):
+        self.snapshots.pop(guild_id, None)
+
+    async def restore(self, guild: discord.Guild, role_ids=None, channel_ids=None, pool_size: int = 5) -> Optional[dict]:
+        """Recreate roles and channels from the snapshot that no longer exist in ``guild``.
+
+        ``role_ids``/``channel_ids`` limit the replay to those snapshot entries; by
+        default everything missing is restored. Returns a report with counts and
+        the time taken, or None if there is no snapshot or a restore is running.
+        """
+        snapshot = self.snapshots.get(guild.id)
+        if snapshot is None or guild.id in self._restoring:
+            return None
+        self._restoring.add(guild.id)
+        started = time.monotonic()
+        pool = TaskPool(limit=pool_size)
+        reason = 'Antinuke: restoring from snapshot'
+        try:
+            existing_roles = {role.id for role in guild.roles}
+            existing_channels = {channel.id for channel in guild.channels}
+            roles = [
+                data for data in snapshot['roles']
+                if data['id'] not in existing_roles and (role_ids is None or data['id'] in role_ids)
+            ]
+            channels = [
+                data for data in snapshot['channels']
+                if data['id'] not in existing_channels and (channel_ids is None or data['id'] in channel_ids)
+            ]
+            # Old snapshot IDs -> recreated objects, used to rewire overwrites and categories
+            role_map = {}
+            channel_map = {}
+
+            async def create_role(data):
+                role_map[data['id']] = await guild.create_role(
+                    name=data['name'],
+                    permissions=discord.Permissions(data['permissions']),
+                    colour=discord.Colour(data['color']),
+                    hoist=data['hoist'],
+                    mentionable=data['mentionable'],
+                    reason=reason
+                )
+
+            def overwrites_for(data):
+                overwrites = {}
+                for entry in data['overwrites']:
+                    overwrite = discord.PermissionOverwrite.from_pair(
+                        discord.Permissions(entry['allow']), discord.Permissions(entry['deny'])
+                    )
+                    if entry['type'] == 'role':
+                        target = role_map.get(entry['id']) or guild.get_role(entry['id'])
+                    else:
+                        target = guild.get_member(entry['id']) or discord.Object(id=entry['id'], type=discord.Member)
+                    if target is not None:
+                        overwrites[target] = overwrite
+                return overwrites
+
+            async def create_channel(data):
+                category = None
+                if data['category_id']:
+                    category = channel_map.get(data['category_id']) or guild.get_channel(data['category_id'])
+                kwargs = {'overwrites': overwrites_for(data), 'position': data['position'], 'reason': reason}
+                kind = data['type']
+                if kind == 'category':
+                    created = await guild.create_category(data['name'], **kwargs)
+                elif kind == 'voice':
+                    created = await guild.create_voice_channel(
+                        data['name'], category=category,
+                        bitrate=min(data.get('bitrate') or 64000, int(guild.bitrate_limit)),
+                        user_limit=data.get('user_limit') or 0, **kwargs
+                    )
+                elif kind == 'stage_voice':
+                    created = await guild.create_stage_channel(data['name'], category=category, **kwargs)
+                else:
+                    created = await guild.create_text_channel(
+                        data['name'], category=category, topic=data.get('topic'),
+                        nsfw=data.get('nsfw', False), slowmode_delay=data.get('slowmode_delay') or 0, **kwargs
+                    )
+                channel_map[data['id']] = created
+
+            role_stats = await pool.run(create_role, roles)
+            if role_map:
+                top = guild.me.top_role.position
+                positions = {
+                    role_map[data['id']]: min(data['position'], top - 1)
+                    for data in roles if data['id'] in role_map
+                }
+                try:
+                    await guild.edit_role_positions(positions, reason=reason)
+                except discord.HTTPException as e:
+                    print(f'[ANTINUKE] Could not reorder restored roles in guild {guild.id}: {str(e)}')
+            category_stats = await pool.run(create_channel, [data for data in channels if data['type'] == 'category'])
+            channel_stats = await pool.run(create_channel, [data for data in channels if data['type'] != 'category'])
+
+            report = {
+                'roles': role_stats.succeeded,
+                'channels': category_stats.succeeded + channel_stats.succeeded,
+                'failed': role_stats.failed + category_stats.failed + channel_stats.failed,
+                'seconds': time.monotonic() - started
             }
-            json.dump(json_data, f, indent=4)
+            self.last_restore[guild.id] = report
+            print(f"[ANTINUKE] Restored {report['roles']} roles and {report['channels']} channels in guild {guild.id} in {report['seconds']:.2f}s ({report['failed']} failed)")
+            return report
+        finally:
+            self._restoring.discard(guild.id)
+
+snapshot_manager = GuildSnapshotManager(antinuke_manager, data_manager.db)
+
+
+class AntinukeEngine:
+    """Counts destructive actions per (guild, actor, action) and punishes actors who exceed the guild's limit."""
+
+    max_tracked = 10000
+    restore_delay = 3  # seconds to let the actor's in-flight requests land before restoring
+
+    def __init__(self, manager: AntinukeManager, audit_logs: AuditLogService, snapshots: GuildSnapshotManager):
+        self.manager = manager
+        self.audit_logs = audit_logs
+        self.snapshots = snapshots
+        self._windows = OrderedDict()
+        self._destroyed = OrderedDict()
+        self._punishing = set()
+        self.incidents = 0
+
+    def _remember_destroyed(self, guild_id: int, actor_id: int, action: discord.AuditLogAction, target_id: int):
+        if action not in (discord.AuditLogAction.channel_delete, discord.AuditLogAction.role_delete):
+            return
+        key = (guild_id, actor_id)
+        targets = self._destroyed.get(key)
+        if targets is None:
+            targets = self._destroyed[key] = deque(maxlen=500)
+            while len(self._destroyed) > self.max_tracked:
+                self._destroyed.popitem(last=False)
+        targets.append((action, target_id))
+
+    async def recover(self, guild: discord.Guild, actor_id: int):
+        """Recreate what ``actor_id`` deleted, using the guild's last snapshot."""
+        await asyncio.sleep(self.restore_delay)
+        targets = self._destroyed.pop((guild.id, actor_id), ())
+        role_ids = {target_id for action, target_id in targets if action == discord.AuditLogAction.role_delete}
+        channel_ids = {target_id for action, target_id in targets if action == discord.AuditLogAction.channel_delete}
+        if role_ids or channel_ids:
+            await self.snapshots.restore(guild, role_ids=role_ids, channel_ids=channel_ids)
+
+    def _window(self, key, settings: 'AntinukeSettings') -> RateWindow:
+        window = self._windows.get(key)
+        if window is None or window.limit != settings.threshold or window.window != settings.window:
+            window = RateWindow(settings.threshold, settings.window)
+            self._windows[key] = window
+            # Forget the least recently active actors so memory stays bounded during long raids
+            while len(self._windows) > self.max_tracked:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(key)
+        return window
 
-antinuke_manager = AntinukeManager()
+    def record(self, guild_id: int, actor_id: int, action: str) -> bool:
+        """Count one action and return True if it pushes the actor over the limit."""
+        settings = self.manager.get_settings(guild_id)
+        return self._window((guild_id, actor_id, action), settings).hit()
+
+    async def handle(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: int):
+        if guild.id not in self.manager.enabled_guilds:
+            return
+        actor = await self.audit_logs.find_actor(guild, action, target_id)
+        if actor is None or actor.id in (guild.owner_id, bot.user.id, OWNER_ID):
+            return
+        if self.manager.is_whitelisted(guild.id, actor.id):
+            return
+        self._remember_destroyed(guild.id, actor.id, action, target_id)
+        if not self.record(guild.id, actor.id, action.name):
+            return
+        key = (guild.id, actor.id)
+        if key in self._punishing:
+            return
+        self._punishing.add(key)
+        self.snapshots.mark_incident(guild.id)
+        try:
+            if await self.punish(guild, actor, action):
+                await self.recover(guild, actor.id)
+        finally:
+            self._punishing.discard(key)
+
+    async def punish(self, guild: discord.Guild, actor: discord.abc.User, action: discord.AuditLogAction) -> bool:
+        settings = self.manager.get_settings(guild.id)
+        reason = f'Antinuke: {action.name} limit ({settings.threshold} in {settings.window:g}s) exceeded'
+        self.incidents += 1
+        print(f'[ANTINUKE] {actor} ({actor.id}) tripped {action.name} in guild {guild.id}')
+        try:
+            if settings.punishment == 'kick':
+                await guild.kick(actor, reason=reason)
+            elif settings.punishment == 'strip':
+                member = actor if isinstance(actor, discord.Member) else await guild.fetch_member(actor.id)
+                roles = [role for role in member.roles[1:] if role < guild.me.top_role and not role.managed]
+                await member.remove_roles(*roles, reason=reason)
+            else:
+                await guild.ban(actor, reason=reason, delete_message_seconds=0)
+                await action_scheduler.cancel(guild.id, actor.id, 'unban')
+        except (discord.Forbidden, discord.NotFound, discord.HTTPException) as e:
+            print(f'[ANTINUKE] Failed to punish {actor.id} in guild {guild.id}: {str(e)}')
+            return False
+        try:
+            embed = discord.Embed(
+                title='<:antinuke1:1389284381247410287> Antinuke Triggered',
+                description=f'**User:** {actor} (`{actor.id}`)\n**Action:** {action.name}\n**Punishment:** {settings.punishment}',
+                color=discord.Color.red()
+            )
+            if guild.owner:
+                await guild.owner.send(embed=embed)
+        except (discord.Forbidden, discord.HTTPException):
+            pass
+        return True
+
+antinuke_engine = AntinukeEngine(antinuke_manager, audit_log_service, snapshot_manager)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    await antinuke_engine.handle(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    await antinuke_engine.handle(role.guild, discord.AuditLogAction.role_delete, role.id)
+
+@bot.event
+async def on_member_ban(guild, user):
+    await antinuke_engine.handle(guild, discord.AuditLogAction.ban, user.id)
+
+@bot.event
+async def on_webhooks_update(channel):
+    await antinuke_engine.handle(channel.guild, discord.AuditLogAction.webhook_create, channel.id)
+
+def _is_guild_owner(ctx) -> bool:
+    return ctx.author.id in (ctx.guild.owner_id, OWNER_ID)
+
+@bot.hybrid_command(name='antinuke', description='Protect the server from destructive actions and restore its layout', usage='<enable/disable/status/snapshot/restore/config> [threshold] [window] [ban/kick/strip]', brief='Protect the server, save or restore its layout, and set how many destructive actions per user are allowed within a time window', extras={'category': 'Antinuke', 'emoji': '<:antinuke1:1389284381247410287>', 'permissions': 'Server owner'})
+async def antinuke(ctx, action: str = 'status', threshold: Optional[int] = None, window: Optional[float] = None, punishment: Optional[str] = None):
+    if not _is_guild_owner(ctx):
+        embed = discord.Embed(
+            title='<a:nope1:1389178762020520109> Error',
+            description='Only the server owner can manage antinuke!',
+            color=discord.Color.red()
+        )
+        return await ctx.send(embed=embed)
+
+    action = action.lower()
+    if action in ('enable', 'disable'):
+        await antinuke_manager.set_enabled(ctx.guild.id, action == 'enable')
+        if action == 'enable':
+            await snapshot_manager.take(ctx.guild, force=True)
+        else:
+            audit_log_service.forget(ctx.guild.id)
+        embed = discord.Embed(
+            title='<:antinuke1:1389284381247410287> Antinuke Updated',
+            description=f'Server protection has been **{action}d**.',
+            color=discord.Color.green() if action == 'enable' else discord.Color.red()
+        )
+        return await ctx.send(embed=embed)
+
+    if action == 'snapshot':
+        await snapshot_manager.take(ctx.guild, force=True)
+        snapshot = snapshot_manager.snapshots[ctx.guild.id]
+        embed = discord.Embed(
+            title='<:antinuke1:1389284381247410287> Snapshot Saved',
+            description=f"Saved {len(snapshot['roles'])} roles and {len(snapshot['channels'])} channels.",
+            color=discord.Color.green()
+        )
+        return await ctx.send(embed=embed)
+
+    if action == 'restore':
+        if ctx.guild.id not in snapshot_manager.snapshots:
+            return await ctx.send('<a:nope1:1389178762020520109> No snapshot exists for this server yet!')
+        await ctx.send('<a:time:1345383309458538518> Restoring missing roles and channels...')
+        report = await snapshot_manager.restore(ctx.guild)
+        if report is None:
+            return await ctx.send('<a:nope1:1389178762020520109> A restore is already running!')
+        embed = discord.Embed(
+            title='<:antinuke1:1389284381247410287> Restore Complete',
+            description=(
+                f"**Roles:** {report['roles']}\n**Channels:** {report['channels']}\n"
+                f"**Failed:** {report['failed']}\n**Time:** {report['seconds']:.2f}s"
+            ),
+            color=discord.Color.green()
+        )
+        return await ctx.send(embed=embed)
+
+    if action == 'config':
+        current = antinuke_manager.get_settings(ctx.guild.id)
+        punishment = (punishment or current.punishment).lower()
+        if punishment not in ANTINUKE_PUNISHMENTS:
+            return await ctx.send(f'<a:nope1:1389178762020520109> Punishment must be one of: {", ".join(ANTINUKE_PUNISHMENTS)}')
+        settings = AntinukeSettings(threshold or current.threshold, window or current.window, punishment)
+        if settings.threshold < 1 or settings.window <= 0:
+            return await ctx.send('<a:nope1:1389178762020520109> Threshold and window must be positive!')
+        await antinuke_manager.set_settings(ctx.guild.id, settings)
+
+    settings = antinuke_manager.get_settings(ctx.guild.id)
+    enabled = ctx.guild.id in antinuke_manager.enabled_guilds
+    embed = discord.Embed(
+        title='<:antinuke1:1389284381247410287> Antinuke Status',
+        description=(
+            f'**Protection:** {"Enabled" if enabled else "Disabled"}\n'
+            f'**Limit:** {settings.threshold} actions in {settings.window:g}s per user\n'
+            f'**Punishment:** {settings.punishment}\n'
+            f'**Whitelisted Users:** {len(antinuke_manager.whitelisted_users.get(ctx.guild.id, ()))}'
+        ),
+        color=discord.Color.blue()
+    )
+    snapshot = snapshot_manager.snapshots.get(ctx.guild.id)
+    if snapshot:
+        embed.add_field(name='Last Snapshot', value=f"<t:{int(snapshot['taken_at'])}:R>", inline=True)
+    last_restore = snapshot_manager.last_restore.get(ctx.guild.id)
+    if last_restore:
+        embed.add_field(name='Last Restore', value=f"{last_restore['roles']} roles, {last_restore['channels']} channels in {last_restore['seconds']:.2f}s", inline=True)
+    await ctx.send(embed=embed)
+
+@bot.hybrid_command(name='whitelist', usage='<add/remove/list> [user]', brief='Manage trusted users for antinuke', extras={'category': 'Antinuke', 'emoji': '<:whitelist:1389590639343308896>', 'permissions': 'Server owner'})
+async def whitelist(ctx, action: str = 'list', user: Optional[discord.User] = None):
+    if not _is_guild_owner(ctx):
+        embed = discord.Embed(
+            title='<a:nope1:1389178762020520109> Error',
+            description='Only the server owner can manage the antinuke whitelist!',
+            color=discord.Color.red()
+        )
+        return await ctx.send(embed=embed)
+
+    action = action.lower()
+    if action in ('add', 'remove'):
+        if user is None:
+            return await ctx.send('<a:nope1:1389178762020520109> Please specify a user!')
+        if action == 'add':
+            await antinuke_manager.add_whitelist(ctx.guild.id, user.id)
+        else:
+            await antinuke_manager.remove_whitelist(ctx.guild.id, user.id)
+        embed = discord.Embed(
+            title='<:whitelist:1389590639343308896> Whitelist Updated',
+            description=f'{user.mention} has been {"added to" if action == "add" else "removed from"} the whitelist.',
+            color=discord.Color.green()
+        )
+        return await ctx.send(embed=embed)
+
+    users = antinuke_manager.whitelisted_users.get(ctx.guild.id, set())
+    embed = discord.Embed(
+        title='<:whitelist:1389590639343308896> Whitelisted Users',
+        description='\n'.join(f'<@{user_id}>' for user_id in users) or 'No users are whitelisted.',
+        color=discord.Color.blue()
+    )
+    await ctx.send(embed=embed)
 
 
 # Ticket System
 class TicketManager:
-    def __init__(self):
+    def __init__(self, db: Database):
+        self.db = db
+        # guild_id -> {'count': int, 'active': {channel_id: {'user_id', 'number', 'created_at'}}}
         self.tickets = {}
-        self.load_data()
-    
-    def load_data(self):
+        self.log_channels = {}
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_counters (
+                guild_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tickets (
+                channel_id INTEGER PRIMARY KEY,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                number INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_guild ON tickets (guild_id)')
+        # Answers "does this user already have a ticket open here?" without a scan
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets (guild_id, user_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_settings (
+                guild_id INTEGER PRIMARY KEY,
+                log_channel_id INTEGER
+            )
+        ''')
+
+    @staticmethod
+    def _import_json(conn: sqlite3.Connection, path: str):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        cursor = conn.cursor()
+        for guild_id, ticket_data in data.items():
+            cursor.execute('INSERT OR IGNORE INTO ticket_counters (guild_id, count) VALUES (?, 0)', (int(guild_id),))
+            cursor.execute(
+                'UPDATE ticket_counters SET count = MAX(count, ?) WHERE guild_id = ?',
+                (int(ticket_data.get('count', 0)), int(guild_id))
+            )
+            cursor.executemany(
+                'INSERT OR IGNORE INTO tickets (channel_id, guild_id, user_id, number, created_at) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (int(channel_id), int(guild_id), int(ticket['user_id']), ticket['number'], ticket['created_at'])
+                    for channel_id, ticket in ticket_data.get('active', {}).items()
+                ]
+            )
+
+    @staticmethod
+    def _read_all(conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        tickets = {}
+        cursor.execute('SELECT guild_id, count FROM ticket_counters')
+        for guild_id, count in cursor.fetchall():
+            tickets[str(guild_id)] = {'count': count, 'active': {}}
+        cursor.execute('SELECT channel_id, guild_id, user_id, number, created_at FROM tickets')
+        for channel_id, guild_id, user_id, number, created_at in cursor.fetchall():
+            ticket_data = tickets.setdefault(str(guild_id), {'count': 0, 'active': {}})
+            ticket_data['active'][str(channel_id)] = {
+                'user_id': str(user_id),
+                'number': number,
+                'created_at': created_at
+            }
+        return tickets
+
+    async def load(self):
+        for path in _legacy_json_paths('tickets.json'):
+            await self.db.run(self._import_json, path)
+            _mark_imported(path)
+            print(f'[DEBUG] Imported tickets from {path}')
+        self.tickets = await self.db.run(self._read_all)
+        rows = await self.db.run(lambda conn: conn.execute(
+            'SELECT guild_id, log_channel_id FROM ticket_settings WHERE log_channel_id IS NOT NULL'
+        ).fetchall())
+        self.log_channels = dict(rows)
+
+    def _guild_data(self, guild_id: str) -> dict:
+        return self.tickets.setdefault(guild_id, {'count': 0, 'active': {}})
+
+    @staticmethod
+    def _increment_counter(conn: sqlite3.Connection, guild_id: int) -> int:
+        conn.execute('INSERT OR IGNORE INTO ticket_counters (guild_id, count) VALUES (?, 0)', (guild_id,))
+        conn.execute('UPDATE ticket_counters SET count = count + 1 WHERE guild_id = ?', (guild_id,))
+        return conn.execute('SELECT count FROM ticket_counters WHERE guild_id = ?', (guild_id,)).fetchone()[0]
+
+    async def next_ticket_number(self, guild_id: str) -> int:
+        number = await self.db.run(self._increment_counter, int(guild_id))
+        self._guild_data(guild_id)['count'] = number
+        return number
+
+    async def open_ticket(self, guild_id: str, channel_id: str, user_id: str, number: int):
+        created_at = discord.utils.utcnow().isoformat()
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO tickets (channel_id, guild_id, user_id, number, created_at) VALUES (?, ?, ?, ?, ?)',
+            (int(channel_id), int(guild_id), int(user_id), number, created_at)
+        ))
+        self._guild_data(guild_id)['active'][channel_id] = {
+            'user_id': user_id,
+            'number': number,
+            'created_at': created_at
+        }
+
+    async def close_ticket(self, guild_id: str, channel_id: str):
+        await self.db.run(lambda conn: conn.execute('DELETE FROM tickets WHERE channel_id = ?', (int(channel_id),)))
+        self._guild_data(guild_id)['active'].pop(channel_id, None)
+
+    def get_log_channel(self, guild_id: int) -> Optional[int]:
+        return self.log_channels.get(guild_id)
+
+    async def set_log_channel(self, guild_id: int, channel_id: Optional[int]):
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO ticket_settings (guild_id, log_channel_id) VALUES (?, ?)', (guild_id, channel_id)
+        ))
+        if channel_id is None:
+            self.log_channels.pop(guild_id, None)
+        else:
+            self.log_channels[guild_id] = channel_id
+
+    async def find_open(self, guild_id: int, user_id: int) -> Optional[int]:
+        """Return the channel ID of ``user_id``'s open ticket in the guild, if any."""
+        row = await self.db.run(lambda conn: conn.execute(
+            'SELECT channel_id FROM tickets WHERE guild_id = ? AND user_id = ? LIMIT 1', (guild_id, user_id)
+        ).fetchone())
+        return row[0] if row else None
+
+ticket_manager = TicketManager(data_manager.db)
+
+class TicketCreator:
+    """Turns panel clicks into ticket channels, safely under bursts.
+
+    A user gets one ticket at a time: clicks while their ticket is being made are
+    dropped, and an existing open ticket is returned instead of a new one. Numbers
+    come from the atomic counter in ticket_counters. Channel creation waits on a
+    per-guild semaphore, so a burst of clicks queues up instead of racing into the
+    channel-create rate limit.
+    """
+
+    max_concurrent = 2  # channel creations in flight per guild
+
+    def __init__(self, manager: TicketManager):
+        self.manager = manager
+        self._pending = set()
+        # guild_id -> [semaphore, creations holding or waiting on it]; dropped when idle
+        self._limits = {}
+
+    async def _create_limited(self, guild: discord.Guild, user: discord.abc.User) -> discord.TextChannel:
+        entry = self._limits.get(guild.id)
+        if entry is None:
+            entry = self._limits[guild.id] = [asyncio.Semaphore(self.max_concurrent), 0]
+        entry[1] += 1
         try:
-            with open('tickets.json', 'r') as f:
-                self.tickets = json.load(f)
-        except FileNotFoundError:
-            self.save_data()
-    
-    def save_data(self):
-        with open('tickets.json', 'w') as f:
-            json.dump(self.tickets, f, indent=4)
+            async with entry[0]:
+                return await self._create_channel(guild, user)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._limits[guild.id]
 
-ticket_manager = TicketManager()
+    async def create(self, guild: discord.Guild, user: discord.abc.User):
+        """Return ``(channel, status)`` where status is ``created``, ``exists`` or ``pending``."""
+        key = (guild.id, user.id)
+        if key in self._pending:
+            return None, 'pending'
+        self._pending.add(key)
+        try:
+            existing_id = await self.manager.find_open(guild.id, user.id)
+            if existing_id is not None:
+                existing = guild.get_channel(existing_id)
+                if existing is not None:
+                    return existing, 'exists'
+                # The channel was deleted by hand; forget the stale ticket
+                await self.manager.close_ticket(str(guild.id), str(existing_id))
 
-class TicketView(View):
-    def __init__(self):
-        super().__init__(timeout=None)
-    
-    @discord.ui.button(label='Create Ticket', style=discord.ButtonStyle.green, emoji='🎫')
-    async def create_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
-        guild_id = str(interaction.guild.id)
-        if guild_id not in ticket_manager.tickets:
-            ticket_manager.tickets[guild_id] = {'count': 0, 'active': {}}
-        
-        ticket_data = ticket_manager.tickets[guild_id]
-        ticket_data['count'] += 1
-        ticket_number = ticket_data['count']
-        
-        # Create ticket channel
+            channel = await self._create_limited(guild, user)
+            return channel, 'created'
+        finally:
+            self._pending.discard(key)
+
+    async def _create_channel(self, guild: discord.Guild, user: discord.abc.User) -> discord.TextChannel:
+        guild_id = str(guild.id)
+        ticket_number = await self.manager.next_ticket_number(guild_id)
         overwrites = {
-            interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            interaction.guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True)
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+            guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True)
         }
-        
-        channel = await interaction.guild.create_text_channel(
+        channel = await guild.create_text_channel(
             f'ticket-{ticket_number}',
             overwrites=overwrites,
-            reason=f'Ticket created by {interaction.user}'
+            reason=f'Ticket created by {user}'
         )
-        
-        ticket_data['active'][str(channel.id)] = {
-            'user_id': str(interaction.user.id),
-            'number': ticket_number,
-            'created_at': discord.utils.utcnow().isoformat()
-        }
-        ticket_manager.save_data()
-        
+        await self.manager.open_ticket(guild_id, str(channel.id), str(user.id), ticket_number)
+
         embed = discord.Embed(
             title='<:ticket1:1389284016099950693> Ticket Created',
-            description=f'Welcome {interaction.user.mention}!\nSupport will be with you shortly.\n\nTicket: #{ticket_number}',
+            description=f'Welcome {user.mention}!\nSupport will be with you shortly.\n\nTicket: #{ticket_number}',
             color=discord.Color.green()
         )
-        
-        class CloseButton(View):
-            def __init__(self):
-                super().__init__(timeout=None)
-            
-            @discord.ui.button(label='Close Ticket', style=discord.ButtonStyle.red, emoji='🔒')
-            async def close_ticket(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-                await channel.delete()
-                del ticket_data['active'][str(channel.id)]
-                ticket_manager.save_data()
-        
-        await channel.send(embed=embed, view=CloseButton())
-        await interaction.response.send_message(f'Your ticket has been created: {channel.mention}', ephemeral=True)
+        await channel.send(embed=embed, view=ticket_view(TicketCloseButton(channel.id)))
+        return channel
+
+ticket_creator = TicketCreator(ticket_manager)
+
+_TRANSCRIPT_HEAD = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ background: #313338; color: #dbdee1; font-family: sans-serif; margin: 2em; }}
+.msg {{ margin: 0.6em 0; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+.time {{ color: #949ba4; font-size: 0.8em; margin-left: 0.5em; }}
+.content {{ white-space: pre-wrap; }}
+a {{ color: #00a8fc; }}
+</style></head><body><h2>{title}</h2>
+'''
+
+class TicketArchiver:
+    """Closes tickets in the background, saving a transcript to the log channel first.
+
+    History is streamed oldest first, one page at a time, into a gzip'd HTML file,
+    so memory stays bounded however long the ticket is. Attachments are
+    re-uploaded to the log channel as they are reached and the transcript links
+    to the copies, since the originals disappear with the channel.
+    """
+
+    page_size = 100
+
+    def __init__(self, manager: TicketManager):
+        self.manager = manager
+        self._closing = set()
+        self._tasks = set()
+
+    def is_closing(self, channel_id: int) -> bool:
+        return channel_id in self._closing
+
+    def close(self, channel: discord.TextChannel, closed_by: discord.abc.User) -> bool:
+        """Start closing ``channel``. Returns False if it is already being closed."""
+        if channel.id in self._closing:
+            return False
+        self._closing.add(channel.id)
+        task = asyncio.create_task(self._close(channel, closed_by))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _close(self, channel: discord.TextChannel, closed_by: discord.abc.User):
+        try:
+            log_id = self.manager.get_log_channel(channel.guild.id)
+            log_channel = channel.guild.get_channel(log_id) if log_id else None
+            if log_channel is not None:
+                try:
+                    await self.archive(channel, log_channel, closed_by)
+                except Exception as e:
+                    print(f'[ERROR] Transcript of ticket channel {channel.id} failed: {str(e)}')
+            try:
+                await channel.delete(reason=f'Ticket closed by {closed_by}')
+            except discord.NotFound:
+                pass
+            await self.manager.close_ticket(str(channel.guild.id), str(channel.id))
+        finally:
+            self._closing.discard(channel.id)
+
+    @staticmethod
+    def _batches(attachments, limit: int) -> list:
+        """Group attachments into uploads that each fit the guild's per-message size limit."""
+        batches = []
+        batch, size = [], 0
+        for attachment in attachments:
+            if attachment.size > limit:
+                continue
+            if batch and size + attachment.size > limit:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(attachment)
+            size += attachment.size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _upload_attachments(self, message: discord.Message, log_channel: discord.TextChannel, limit: int) -> dict:
+        """Re-upload a message's attachments, returning ``{original url: copy url}``.
+
+        Anything that cannot be downloaded or uploaded is left out, so the
+        transcript falls back to its original URL.
+        """
+        copies = {}
+        for batch in self._batches(message.attachments, limit):
+            pairs = []
+            for attachment in batch:
+                try:
+                    pairs.append((attachment, await attachment.to_file()))
+                except discord.HTTPException:
+                    pass
+            if not pairs:
+                continue
+            try:
+                copy = await log_channel.send(
+                    content=f'Attachments from {message.author} ({message.author.id}) in #{message.channel.name}',
+                    files=[file for _, file in pairs]
+                )
+            except discord.HTTPException as e:
+                print(f'[DEBUG] Could not copy attachments of message {message.id}: {str(e)}')
+                continue
+            copies.update((original.url, new.url) for (original, _), new in zip(pairs, copy.attachments))
+        return copies
+
+    def _render(self, message: discord.Message, copies: dict) -> str:
+        parts = [
+            f'<div class="msg"><span class="author">{html.escape(str(message.author))}</span>'
+            f'<span class="time">{message.created_at.strftime("%Y-%m-%d %H:%M:%S")} UTC</span>'
+        ]
+        if message.content:
+            parts.append(f'<div class="content">{html.escape(message.content)}</div>')
+        for embed in message.embeds:
+            text = ' — '.join(html.escape(part) for part in (embed.title, embed.description) if part)
+            if text:
+                parts.append(f'<div class="content">[embed] {text}</div>')
+        for attachment in message.attachments:
+            url = html.escape(copies.get(attachment.url, attachment.url))
+            parts.append(f'<div><a href="{url}">{html.escape(attachment.filename)}</a></div>')
+        parts.append('</div>\n')
+        return ''.join(parts)
+
+    async def archive(self, channel: discord.TextChannel, log_channel: discord.TextChannel, closed_by: discord.abc.User):
+        ticket = self.manager.tickets.get(str(channel.guild.id), {}).get('active', {}).get(str(channel.id), {})
+        title = f'Transcript of #{channel.name}'
+        limit = channel.guild.filesize_limit
+        count = 0
+        participants = set()
+        started = time.monotonic()
+        handle, path = tempfile.mkstemp(prefix='xecura-transcript-', suffix='.html.gz')
+        os.close(handle)
+        try:
+            out = gzip.open(path, 'wt', encoding='utf-8')
+            try:
+                await asyncio.to_thread(out.write, _TRANSCRIPT_HEAD.format(title=html.escape(title)))
+                page = []
+                async for message in channel.history(limit=None, oldest_first=True):
+                    copies = await self._upload_attachments(message, log_channel, limit) if message.attachments else {}
+                    page.append(self._render(message, copies))
+                    participants.add(message.author.id)
+                    count += 1
+                    if len(page) >= self.page_size:
+                        await asyncio.to_thread(out.write, ''.join(page))
+                        page = []
+                page.append('</body></html>\n')
+                await asyncio.to_thread(out.write, ''.join(page))
+            finally:
+                await asyncio.to_thread(out.close)
+
+            embed = discord.Embed(
+                title='<:ticket1:1389284016099950693> Ticket Closed',
+                description=(
+                    f'**Ticket:** #{ticket.get("number", "?")} ({channel.name})\n'
+                    f'**Opened By:** <@{ticket["user_id"]}>\n' if ticket else f'**Ticket:** {channel.name}\n'
+                ) + (
+                    f'**Closed By:** {closed_by.mention}\n'
+                    f'**Messages:** {count} from {len(participants)} participants'
+                ),
+                color=discord.Color.red()
+            )
+            if os.path.getsize(path) <= limit:
+                await log_channel.send(embed=embed, file=discord.File(path, filename=f'{channel.name}.html.gz'))
+            else:
+                embed.add_field(name='Transcript', value='Too large to upload', inline=False)
+                await log_channel.send(embed=embed)
+            print(f'[DEBUG] Archived {count} messages from ticket channel {channel.id} in {time.monotonic() - started:.1f}s')
+        finally:
+            os.remove(path)
+
+ticket_archiver = TicketArchiver(ticket_manager)
+
+def ticket_view(*items: discord.ui.Item) -> View:
+    view = View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    return view
+
+# Ticket buttons are stateless: everything they need is in their custom_id, so one
+# registered handler per button type serves every panel and ticket, across restarts
+class TicketPanelButton(discord.ui.DynamicItem[discord.ui.Button], template=r'xecura:ticket:create'):
+    def __init__(self):
+        super().__init__(discord.ui.Button(
+            label='Create Ticket', style=discord.ButtonStyle.green, emoji='🎫', custom_id='xecura:ticket:create'
+        ))
 
-@bot.command(name='setup-tickets')
-@commands.has_permissions(administrator=True)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction):
+        # Acknowledge right away; creation may wait behind other clicks
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            channel, status = await ticket_creator.create(interaction.guild, interaction.user)
+        except discord.Forbidden:
+            return await interaction.followup.send('<a:nope1:1389178762020520109> I do not have permission to create ticket channels!', ephemeral=True)
+        if status == 'pending':
+            await interaction.followup.send('<a:time:1345383309458538518> Your ticket is already being created!', ephemeral=True)
+        elif status == 'exists':
+            await interaction.followup.send(f'<a:nope1:1389178762020520109> You already have an open ticket: {channel.mention}', ephemeral=True)
+        else:
+            await interaction.followup.send(f'Your ticket has been created: {channel.mention}', ephemeral=True)
+
+class TicketCloseButton(discord.ui.DynamicItem[discord.ui.Button], template=r'xecura:ticket:close:(?P<channel_id>[0-9]+)'):
+    def __init__(self, channel_id: int):
+        super().__init__(discord.ui.Button(
+            label='Close Ticket', style=discord.ButtonStyle.red, emoji='🔒', custom_id=f'xecura:ticket:close:{channel_id}'
+        ))
+        self.channel_id = channel_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['channel_id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        channel = interaction.guild.get_channel(self.channel_id) if interaction.guild else None
+        if channel is None:
+            return await interaction.response.send_message('<a:nope1:1389178762020520109> This ticket no longer exists!', ephemeral=True)
+        if not ticket_archiver.close(channel, interaction.user):
+            return await interaction.response.send_message('<a:time:1345383309458538518> This ticket is already closing!', ephemeral=True)
+        await interaction.response.send_message(f'🔒 Ticket closed by {interaction.user.mention}. This channel will be deleted shortly.')
+
+@bot.hybrid_command(name='setup-tickets', brief='Create the ticket panel', extras={'category': 'Tickets', 'emoji': '<:ticket1:1389284016099950693>'})
+@require_permissions(administrator=True)
 async def setup_tickets(ctx):
     embed = discord.Embed(
         title='<:ticket1:1389284016099950693> Create a Ticket',
         description='Click the button below to create a support ticket.',
         color=discord.Color.blue()
     )
-    await ctx.send(embed=embed, view=TicketView())
+    await ctx.send(embed=embed, view=ticket_view(TicketPanelButton()))
+
+@bot.hybrid_command(name='ticket-settings', usage='[log] [#channel]', brief='Set the channel that receives ticket transcripts', extras={'category': 'Tickets', 'emoji': '<a:setting1:1389590399760334868>'})
+@require_permissions(administrator=True)
+async def ticket_settings(ctx, option: str = 'show', channel: Optional[discord.TextChannel] = None):
+    option = option.lower()
+    if option == 'log':
+        if channel is not None:
+            permissions = channel.permissions_for(ctx.guild.me)
+            if not (permissions.send_messages and permissions.attach_files):
+                return await ctx.send(f'<a:nope1:1389178762020520109> I need to send messages and attach files in {channel.mention}!')
+        await ticket_manager.set_log_channel(ctx.guild.id, channel.id if channel else None)
+    elif option != 'show':
+        return await ctx.send('<a:nope1:1389178762020520109> Use `ticket-settings log [#channel]` (leave the channel out to turn transcripts off)')
+
+    log_id = ticket_manager.get_log_channel(ctx.guild.id)
+    active = ticket_manager.tickets.get(str(ctx.guild.id), {}).get('active', {})
+    embed = discord.Embed(
+        title='<a:setting1:1389590399760334868> Ticket Settings',
+        description=(
+            f'**Log Channel:** {f"<#{log_id}>" if log_id else "Not set (transcripts off)"}\n'
+            f'**Open Tickets:** {len(active)}'
+        ),
+        color=discord.Color.blue()
+    )
+    await ctx.send(embed=embed)
 
 # Update help menu with new categories
 # Help menu implementation moved to the top of the file
 
-@bot.command(name='ping')
+@bot.hybrid_command(name='prefix', usage='<list/add/remove/reset> [prefix]', brief="Manage this server's command prefixes", extras={'category': 'Utility', 'emoji': '<:prefix1:1389181942553116695>', 'permissions': 'Manage Server to change'})
+async def prefix(ctx, action: str = 'list', *, value: Optional[str] = None):
+    action = action.lower()
+    if action == 'list' or not ctx.guild:
+        prefixes = prefix_manager.get(ctx.guild.id if ctx.guild else None)
+        embed = discord.Embed(
+            title='<:prefix1:1389181942553116695> Prefixes',
+            description='\n'.join(f'`{p}`' for p in prefixes) + f'\n{bot.user.mention}',
+            color=discord.Color.blue()
+        )
+        return await ctx.send(embed=embed)
+
+    if not ctx.author.guild_permissions.manage_guild:
+        raise commands.MissingPermissions(['manage_guild'])
+
+    current = prefix_manager.get(ctx.guild.id)
+    if action == 'add':
+        if not value or len(value) > PrefixManager.max_length:
+            return await ctx.send(f'<a:nope1:1389178762020520109> Prefixes must be 1-{PrefixManager.max_length} characters long!')
+        if value in current:
+            return await ctx.send('<a:nope1:1389178762020520109> That prefix is already set!')
+        if len(current) >= PrefixManager.max_prefixes:
+            return await ctx.send(f'<a:nope1:1389178762020520109> A server can have at most {PrefixManager.max_prefixes} prefixes!')
+        await prefix_manager.add(ctx.guild.id, value)
+        description = f'Added prefix `{value}`'
+    elif action == 'remove':
+        if value not in current:
+            return await ctx.send('<a:nope1:1389178762020520109> That prefix is not set!')
+        if len(current) == 1:
+            return await ctx.send('<a:nope1:1389178762020520109> A server needs at least one prefix!')
+        await prefix_manager.remove(ctx.guild.id, value)
+        description = f'Removed prefix `{value}`'
+    elif action == 'reset':
+        await prefix_manager.reset(ctx.guild.id)
+        description = f'Prefixes reset to `{DEFAULT_PREFIX}`'
+    else:
+        return await ctx.send('<a:nope1:1389178762020520109> Use `prefix <list/add/remove/reset> [prefix]`')
+
+    embed = discord.Embed(
+        title='<:tick1:1389181551358509077> Prefixes Updated',
+        description=description,
+        color=discord.Color.green()
+    )
+    await ctx.send(embed=embed)
+
+class GuildStats:
+    """Member, bot and guild totals kept up to date from gateway events.
+
+    Joins, leaves and guild changes adjust the counters in O(1), so stats
+    commands never walk member lists. A background pass recounts one guild at a
+    time every ``reconcile_interval`` seconds to correct any drift, e.g. from
+    events missed during a reconnect.
+    """
+
+    reconcile_interval = 1800
+
+    def __init__(self):
+        self._guilds = {}  # guild_id -> [members, bots]
+        self.members = 0
+        self.bots = 0
+        self.guilds_by_shard = Counter()
+        self.last_reconcile = None
+        self._task = None
+
+    @property
+    def guilds(self) -> int:
+        return len(self._guilds)
+
+    def get(self, guild: discord.Guild):
+        """Return ``(members, bots)`` for ``guild``, counting it first if it is new."""
+        counts = self._guilds.get(guild.id)
+        if counts is None:
+            counts = self.add_guild(guild)
+        return counts[0], counts[1]
+
+    def add_guild(self, guild: discord.Guild) -> list:
+        self.remove_guild(guild)
+        counts = self._guilds[guild.id] = [guild.member_count or 0, sum(1 for member in guild.members if member.bot)]
+        self.members += counts[0]
+        self.bots += counts[1]
+        self.guilds_by_shard[guild.shard_id] += 1
+        return counts
+
+    def remove_guild(self, guild: discord.Guild):
+        counts = self._guilds.pop(guild.id, None)
+        if counts is not None:
+            self.members -= counts[0]
+            self.bots -= counts[1]
+            self.guilds_by_shard[guild.shard_id] -= 1
+
+    def member_joined(self, member: discord.Member, delta: int = 1):
+        counts = self._guilds.get(member.guild.id)
+        if counts is None:
+            self.add_guild(member.guild)  # Counts this member already
+            return
+        counts[0] += delta
+        self.members += delta
+        if member.bot:
+            counts[1] += delta
+            self.bots += delta
+
+    def member_left(self, member: discord.Member):
+        self.member_joined(member, -1)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def reconcile(self):
+        started = time.monotonic()
+        seen = set()
+        for index, guild in enumerate(list(bot.guilds)):
+            seen.add(guild.id)
+            # Replace one guild at a time; events between guilds adjust the new counts
+            self.add_guild(guild)
+            if index % 20 == 19:
+                await asyncio.sleep(0)
+        for guild_id in [guild_id for guild_id in self._guilds if guild_id not in seen]:
+            counts = self._guilds.pop(guild_id)
+            self.members -= counts[0]
+            self.bots -= counts[1]
+            self.guilds_by_shard[(guild_id >> 22) % (bot.shard_count or 1)] -= 1
+        self.last_reconcile = time.time()
+        print(f'[DEBUG] Reconciled stats for {len(seen)} guilds in {time.monotonic() - started:.2f}s')
+
+    async def _reconcile_loop(self):
+        await bot.wait_until_ready()
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f'[ERROR] Stats reconciliation failed: {str(e)}')
+            await asyncio.sleep(self.reconcile_interval)
+
+guild_stats = GuildStats()
+
+@bot.event
+async def on_member_remove(member):
+    guild_stats.member_left(member)
+    member_cache.invalidate(member.guild.id, member.id)
+
+@bot.event
+async def on_guild_join(guild):
+    guild_stats.add_guild(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    guild_stats.remove_guild(guild)
+
+class ShardMonitor:
+    """Smoothed per-shard message rates, sampled every ``interval`` seconds."""
+
+    interval = 10.0
+    smoothing = 0.3
+
+    def __init__(self):
+        self._counts = {}
+        self.message_rates = {}  # shard_id -> messages/sec
+        self._task = None
+
+    def record_message(self, shard_id: int):
+        self._counts[shard_id] = self._counts.get(shard_id, 0) + 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sample_loop())
+
+    async def _sample_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            counts, self._counts = self._counts, {}
+            for shard_id in set(counts) | set(self.message_rates):
+                rate = counts.get(shard_id, 0) / self.interval
+                previous = self.message_rates.get(shard_id)
+                self.message_rates[shard_id] = rate if previous is None else previous + (rate - previous) * self.smoothing
+
+    def report(self, limit: int = 15, include: Optional[int] = None) -> list:
+        """One line per shard (latency, guilds, message rate), at most ``limit`` plus ``include``."""
+        latencies = dict(bot.latencies) if SHARDED else {0: bot.latency}
+        guilds = guild_stats.guilds_by_shard
+        shown = sorted(latencies)[:limit]
+        if include is not None and include in latencies and include not in shown:
+            shown.append(include)
+        lines = []
+        for shard_id in shown:
+            latency = latencies[shard_id]
+            latency_text = f'{round(latency * 1000)}ms' if math.isfinite(latency) else 'offline'
+            marker = ' ⬅' if shard_id == include else ''
+            lines.append(
+                f'`#{shard_id}` {latency_text} • {guilds.get(shard_id, 0)} servers • '
+                f'{self.message_rates.get(shard_id, 0.0):.1f} msg/s{marker}'
+            )
+        if len(latencies) > len(shown):
+            lines.append(f'...and {len(latencies) - len(shown)} more shards')
+        return lines
+
+shard_monitor = ShardMonitor()
+
+@bot.hybrid_command(name='ping', brief="Check bot's latency", extras={'category': 'General', 'emoji': '<a:ping:1345381376433717269>'})
 async def ping(ctx):
     embed = discord.Embed(
         title='<a:ping:1345381376433717269> Pong!',
         description=f'Latency: {round(bot.latency * 1000)}ms',
         color=discord.Color.green()
     )
+    if SHARDED:
+        shard_id = ctx.guild.shard_id if ctx.guild else 0
+        embed.add_field(name=f'Shards ({bot.shard_count})', value='\n'.join(shard_monitor.report(include=shard_id))[:1024], inline=False)
     await ctx.send(embed=embed)
 
 
-@bot.command(name='ban')
-@commands.has_permissions(ban_members=True)
+@bot.hybrid_command(name='ban', usage='<user> [reason]', brief='Ban a member from the server', extras={'category': 'Moderation', 'emoji': '<:ban:1345360761236488276>'})
+@require_permissions(ban_members=True)
 async def ban(ctx, member: discord.Member, *, reason=None):
     if member.top_role >= ctx.author.top_role and ctx.author.id != OWNER_ID:
         embed = discord.Embed(
@@ -701,6 +3386,8 @@ async def ban(ctx, member: discord.Member, *, reason=None):
     
     try:
         await member.ban(reason=reason)
+        # A permanent ban replaces any tempban that would lift it
+        await action_scheduler.cancel(ctx.guild.id, member.id, 'unban')
         embed = discord.Embed(
             title='<:tick1:1389181551358509077> Member Banned',
             description=f'{member.mention} has been banned\nReason: {reason or "No reason provided"}',
@@ -716,7 +3403,7 @@ async def ban(ctx, member: discord.Member, *, reason=None):
         await ctx.send(embed=embed)
 
 # New General Commands
-@bot.command(name='avatar')
+@bot.hybrid_command(name='avatar', usage='[user]', brief="View user's avatar", extras={'category': 'General', 'emoji': '<:avatar1:1389603923316441199>'})
 async def avatar(ctx, member: Optional[discord.Member] = None):
     member = member or ctx.author
     embed = discord.Embed(
@@ -726,7 +3413,7 @@ async def avatar(ctx, member: Optional[discord.Member] = None):
     embed.set_image(url=member.avatar.url if member.avatar else member.default_avatar.url)
     await ctx.send(embed=embed)
 
-@bot.command(name='servericon')
+@bot.hybrid_command(name='servericon', brief="View server's icon", extras={'category': 'General', 'emoji': '<:server1:1389588267808325632>'})
 async def servericon(ctx):
     if not ctx.guild.icon:
         return await ctx.send('<a:nope1:1389178762020520109> This server has no icon!')
@@ -737,21 +3424,21 @@ async def servericon(ctx):
     embed.set_image(url=ctx.guild.icon.url)
     await ctx.send(embed=embed)
 
-@bot.command(name='members')
+@bot.hybrid_command(name='members', brief='View server member statistics', extras={'category': 'General', 'emoji': '<:members1:1389604287469977691>'})
 async def members(ctx):
-    total = len(ctx.guild.members)
-    humans = len([m for m in ctx.guild.members if not m.bot])
-    bots = len([m for m in ctx.guild.members if m.bot])
+    total, bots = guild_stats.get(ctx.guild)
+    # Without the member cache there is no list to tell bots from humans
+    breakdown = '' if LOW_MEMORY else f'\nHumans: {total - bots}\nBots: {bots}'
     embed = discord.Embed(
         title=f'{ctx.guild.name} Member Stats',
-        description=f'<:members1:1389604287469977691> Total Members: {total}\nHumans: {humans}\nBots: {bots}',
+        description=f'<:members1:1389604287469977691> Total Members: {total}{breakdown}',
         color=discord.Color.blue()
     )
     await ctx.send(embed=embed)
 
 # New Moderation Commands
-@bot.command(name='slowmode')
-@commands.has_permissions(manage_channels=True)
+@bot.hybrid_command(name='slowmode', usage='<seconds>', brief='Set channel slowmode', extras={'category': 'Moderation', 'emoji': '<:slowmode1:1389604723610619984>'})
+@require_permissions(manage_channels=True)
 async def slowmode(ctx, seconds: int):
     if seconds < 0 or seconds > 21600:
         return await ctx.send('<a:nope1:1389178762020520109> Slowmode must be between 0 and 21600 seconds!')
@@ -763,8 +3450,8 @@ async def slowmode(ctx, seconds: int):
     )
     await ctx.send(embed=embed)
 
-@bot.command(name='nickname')
-@commands.has_permissions(manage_nicknames=True)
+@bot.hybrid_command(name='nickname', usage='<user> [new_nick]', brief="Change user's nickname", extras={'category': 'Moderation', 'emoji': '<a:nickname1:1389605067622977579>'})
+@require_permissions(manage_nicknames=True)
 async def nickname(ctx, member: discord.Member, *, new_nick=None):
     try:
         await member.edit(nick=new_nick)
@@ -778,11 +3465,12 @@ async def nickname(ctx, member: discord.Member, *, new_nick=None):
         await ctx.send('<a:nope1:1389178762020520109> I cannot change that member\'s nickname!')
 
 
-@bot.command(name='unmute')
-@commands.has_permissions(moderate_members=True)
+@bot.hybrid_command(name='unmute', usage='<user>', brief='Remove timeout from a user', extras={'category': 'Moderation', 'emoji': '<:unmute1:1389605655622717551>'})
+@require_permissions(moderate_members=True)
 async def unmute(ctx, member: discord.Member):
     try:
         await member.timeout(None)
+        await action_scheduler.cancel(ctx.guild.id, member.id, 'mute')
         embed = discord.Embed(
             title='<:tick1:1389181551358509077> Member Unmuted',
             description=f'{member.mention} has been unmuted',
@@ -793,8 +3481,8 @@ async def unmute(ctx, member: discord.Member):
         await ctx.send('<a:nope1:1389178762020520109> I cannot unmute that member!')
 
 # New Utility Commands
-@bot.command(name='role')
-@commands.has_permissions(manage_roles=True)
+@bot.hybrid_command(name='role', usage='<user> <role>', brief='Add/remove role from user', extras={'category': 'Utility', 'emoji': '<:role1:1389607749985370255>'})
+@require_permissions(manage_roles=True)
 async def role(ctx, member: discord.Member, *, role: discord.Role):
     if role >= ctx.author.top_role:
         return await ctx.send('<a:nope1:1389178762020520109> You cannot manage a role higher than your own!')
@@ -811,8 +3499,8 @@ async def role(ctx, member: discord.Member, *, role: discord.Role):
     )
     await ctx.send(embed=embed)
 
-@bot.command(name='createchannel')
-@commands.has_permissions(manage_channels=True)
+@bot.hybrid_command(name='createchannel', usage='<name> [type]', brief='Create a new channel', extras={'category': 'Utility', 'emoji': '<:invites:1345380333222367285>'})
+@require_permissions(manage_channels=True)
 async def createchannel(ctx, channel_name, channel_type='text'):
     if channel_type.lower() not in ['text', 'voice']:
         return await ctx.send('<a:nope1:1389178762020520109> Invalid channel type! Use \'text\' or \'voice\'')
@@ -825,8 +3513,8 @@ async def createchannel(ctx, channel_name, channel_type='text'):
     )
     await ctx.send(embed=embed)
 
-@bot.command(name='deletechannel')
-@commands.has_permissions(manage_channels=True)
+@bot.hybrid_command(name='deletechannel', usage='<channel>', brief='Delete a channel', extras={'category': 'Utility', 'emoji': '<:delch1:1389608102583603262>'})
+@require_permissions(manage_channels=True)
 async def deletechannel(ctx, channel: discord.TextChannel):
     await channel.delete()
     embed = discord.Embed(
@@ -838,51 +3526,253 @@ async def deletechannel(ctx, channel: discord.TextChannel):
 
 
 
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
+# Automod
+AutoModSettings = namedtuple('AutoModSettings', ['enabled', 'invites', 'links', 'spam_rate', 'spam_per', 'action', 'mute_seconds'])
+AUTOMOD_ACTIONS = ('delete', 'warn', 'mute')
+AUTOMOD_RULES = {'spam': 'sending messages too fast', 'invite': 'posting invite links', 'link': 'posting links', 'word': 'using a blocked word'}
+DEFAULT_AUTOMOD_SETTINGS = AutoModSettings(enabled=False, invites=True, links=False, spam_rate=5, spam_per=5.0, action='delete', mute_seconds=600.0)
+_INVITE_PATTERN = r'discord(?:\.gg|(?:app)?\.com/invite)/\S'
+_WORD_TOKEN = re.compile(r'\w+')
 
-    # Check if user has no-prefix privilege
-    has_no_prefix = str(message.author.id) in data_manager.no_prefix_users
-
-    # Process commands with or without prefix based on user's status
-    if has_no_prefix:
-        ctx = await bot.get_context(message)
-        if ctx.command is None:
-            # Try to find the command without prefix
-            command_name = message.content.split()[0].lower()
-            command = bot.get_command(command_name)
-            if command:
-                message.content = f"{DEFAULT_PREFIX}{message.content}"
-                await bot.process_commands(message)
-                return
+class AutoMod:
+    """Filters messages before command dispatch.
 
-        await bot.process_commands(message)
-        # Optional: only send embed for no-prefix users
-        # await ctx.send(embed=embed)
+    Each enabled guild's rules are compiled at load and on config changes only:
+    invite and link rules into one regex with a named group per rule (only run
+    on messages containing a ``/``), single blocked words into a frozenset
+    checked against the message's whitespace tokens (the ``\\w+`` tokenizer only
+    runs on tokens with punctuation in them), and any multi-word phrases into one
+    more regex over the same lowercased text. Spam is a token bucket per user,
+    grouped by guild, refilled at ``spam_rate`` per ``spam_per`` seconds. Guilds
+    without automod cost one dict lookup per message; guilds without word rules
+    skip tokenizing entirely.
+    """
 
-    else:
-        await bot.process_commands(message)
-        # Optional: uncomment if you want to send embed for others too
-        # ctx = await bot.get_context(message)
-        # await ctx.send(embed=embed)
+    max_words = 500
+    max_word_length = 50
+    max_tracked = 100000
 
+    def __init__(self, db: Database):
+        self.db = db
+        self.settings = {}
+        self.words = {}
+        self._compiled = {}  # guild_id -> (settings, url pattern, word set, phrase pattern), enabled guilds only
+        self._buckets = {}  # guild_id -> {user_id: [tokens, last refill]}
+        self._tracked = 0  # buckets across all guilds
+        self._punished = OrderedDict()  # (guild_id, user_id) -> last punishment
+        self.violations = 0
+        self.db.call(self.init_database)
 
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS automod_settings (
+                guild_id INTEGER PRIMARY KEY,
+                enabled INTEGER NOT NULL,
+                invites INTEGER NOT NULL,
+                links INTEGER NOT NULL,
+                spam_rate INTEGER NOT NULL,
+                spam_per REAL NOT NULL,
+                action TEXT NOT NULL,
+                mute_seconds REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS automod_words (
+                guild_id INTEGER NOT NULL,
+                word TEXT NOT NULL,
+                PRIMARY KEY (guild_id, word)
+            ) WITHOUT ROWID
+        ''')
 
-    try:
-        warn_dm = discord.Embed(
-            title='⚠️ Warning Received',
-            description=f'You have been warned in {ctx.guild.name}\n**Reason:** {reason or "No reason provided"}\n**Moderator:** {ctx.author}',
-            color=discord.Color.yellow()
-        )
-        await member.send(embed=warn_dm)
-    except discord.Forbidden:
-        pass
+    async def load(self):
+        def read(conn):
+            settings = conn.execute(
+                'SELECT guild_id, enabled, invites, links, spam_rate, spam_per, action, mute_seconds FROM automod_settings'
+            ).fetchall()
+            return settings, conn.execute('SELECT guild_id, word FROM automod_words').fetchall()
+
+        settings, words = await self.db.run(read)
+        self.settings = {row[0]: AutoModSettings(bool(row[1]), bool(row[2]), bool(row[3]), *row[4:]) for row in settings}
+        self.words = {}
+        for guild_id, word in words:
+            self.words.setdefault(guild_id, set()).add(word)
+        self._compiled = {}
+        for guild_id in self.settings:
+            self._compile(guild_id)
+
+    def get_settings(self, guild_id: int) -> AutoModSettings:
+        return self.settings.get(guild_id, DEFAULT_AUTOMOD_SETTINGS)
+
+    def _compile(self, guild_id: int):
+        settings = self.get_settings(guild_id)
+        if not settings.enabled:
+            self._compiled.pop(guild_id, None)
+            return
+        parts = []
+        if settings.invites:
+            parts.append(f'(?P<invite>{_INVITE_PATTERN})')
+        if settings.links:
+            parts.append(r'(?P<link>https?://\S)')
+        urls = re.compile('|'.join(parts), re.IGNORECASE) if parts else None
+        words = self.words.get(guild_id, ())
+        single = frozenset(word for word in words if _WORD_TOKEN.fullmatch(word))
+        # Longest first so a phrase is never shadowed by one of its prefixes
+        phrases = sorted((word for word in words if word not in single), key=len, reverse=True)
+        # Matched against the lowercased message, like the single words
+        phrase_pattern = re.compile(
+            '(?<!\\w)(?:' + '|'.join(re.escape(phrase.lower()) for phrase in phrases) + ')(?!\\w)'
+        ) if phrases else None
+        self._compiled[guild_id] = (settings, urls, single or None, phrase_pattern)
+
+    async def set_settings(self, guild_id: int, settings: AutoModSettings):
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO automod_settings (guild_id, enabled, invites, links, spam_rate, spam_per, action, mute_seconds) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (guild_id, int(settings.enabled), int(settings.invites), int(settings.links), settings.spam_rate,
+             settings.spam_per, settings.action, settings.mute_seconds)
+        ))
+        self.settings[guild_id] = settings
+        self._compile(guild_id)
+
+    async def add_word(self, guild_id: int, word: str) -> bool:
+        words = self.words.setdefault(guild_id, set())
+        if word in words or len(words) >= self.max_words:
+            return False
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR IGNORE INTO automod_words (guild_id, word) VALUES (?, ?)', (guild_id, word)
+        ))
+        words.add(word)
+        self._compile(guild_id)
+        return True
+
+    async def remove_word(self, guild_id: int, word: str) -> bool:
+        words = self.words.get(guild_id, set())
+        if word not in words:
+            return False
+        await self.db.run(lambda conn: conn.execute(
+            'DELETE FROM automod_words WHERE guild_id = ? AND word = ?', (guild_id, word)
+        ))
+        words.discard(word)
+        self._compile(guild_id)
+        return True
+
+    def _prune_buckets(self, now: float):
+        # A bucket idle for a full window has refilled, which is the same as having none
+        pruned = {}
+        for guild_id, buckets in self._buckets.items():
+            per = self.get_settings(guild_id).spam_per
+            kept = {user_id: bucket for user_id, bucket in buckets.items() if now - bucket[1] < per}
+            if kept:
+                pruned[guild_id] = kept
+        self._buckets = pruned
+        self._tracked = sum(len(buckets) for buckets in pruned.values())
+        if self._tracked > self.max_tracked // 2:
+            self._buckets = {}
+            self._tracked = 0
+
+    def _take_token(self, guild_id: int, user_id: int, settings: AutoModSettings, now: float) -> bool:
+        buckets = self._buckets.get(guild_id)
+        bucket = buckets.get(user_id) if buckets is not None else None
+        if bucket is None:
+            if self._tracked >= self.max_tracked:
+                self._prune_buckets(now)
+            self._buckets.setdefault(guild_id, {})[user_id] = [settings.spam_rate - 1.0, now]
+            self._tracked += 1
+            return True
+        tokens = bucket[0] + (now - bucket[1]) * settings.spam_rate / settings.spam_per
+        if tokens > settings.spam_rate:
+            tokens = settings.spam_rate
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1.0
+        return True
+
+    def inspect(self, message: discord.Message) -> Optional[str]:
+        """Return the rule ``message`` breaks (a key of AUTOMOD_RULES), or None."""
+        compiled = self._compiled.get(message.guild.id)
+        if compiled is None:
+            return None
+        settings, urls, words, phrases = compiled
+        if settings.spam_rate and not self._take_token(message.guild.id, message.author.id, settings, time.monotonic()):
+            return 'spam'
+        content = message.content
+        if not content:
+            return None
+        if urls is not None and '/' in content:
+            match = urls.search(content)
+            if match is not None:
+                return match.lastgroup
+        if words is None and phrases is None:
+            return None
+        lowered = content.lower()
+        if words is not None:
+            tokens = lowered.split()
+            if not words.isdisjoint(tokens):
+                return 'word'
+            for token in tokens:
+                # "badword!" or "a,badword": split further only where punctuation is
+                if not token.isalnum() and not words.isdisjoint(_WORD_TOKEN.findall(token)):
+                    return 'word'
+        if phrases is not None and phrases.search(lowered):
+            return 'word'
+        return None
+
+    async def enforce(self, message: discord.Message, rule: str) -> bool:
+        """Act on a violation. Returns False if the author is exempt and the message should go through."""
+        member = message.author
+        if not isinstance(member, discord.Member) or member.guild_permissions.manage_messages:
+            return False
+        self.violations += 1
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+
+        # Punish once per burst rather than once per deleted message
+        settings = self.get_settings(member.guild.id)
+        key = (member.guild.id, member.id)
+        now = time.monotonic()
+        if now - self._punished.get(key, -settings.spam_per) < settings.spam_per:
+            return True
+        self._punished[key] = now
+        self._punished.move_to_end(key)
+        if len(self._punished) > 1000:
+            self._punished.popitem(last=False)
+
+        reason = f'AutoMod: {AUTOMOD_RULES[rule]}'
+        notice = f'{member.mention} your message was removed for {AUTOMOD_RULES[rule]}.'
+        try:
+            if settings.action == 'warn':
+                count = await warning_ledger.add(member.guild.id, member.id, bot.user.id, reason)
+                escalation = await warning_ledger.escalate(member, count)
+                notice = f'{member.mention} you have been warned for {AUTOMOD_RULES[rule]} ({count} warnings).'
+                if escalation:
+                    notice += f' You were {escalation}.'
+            elif settings.action == 'mute':
+                await action_scheduler.schedule_mute(member, datetime.timedelta(seconds=settings.mute_seconds), reason=reason)
+                notice = f'{member.mention} you have been muted for {AUTOMOD_RULES[rule]}.'
+            await message.channel.send(notice, delete_after=5)
+        except discord.HTTPException as e:
+            print(f'[DEBUG] AutoMod action failed in guild {member.guild.id}: {str(e)}')
+        return True
+
+auto_mod = AutoMod(data_manager.db)
 
+@bot.event
+async def on_message(message):
+    if message.author.bot:
+        return
+    if message.guild is not None:
+        shard_monitor.record_message(message.guild.shard_id)
+        rule = auto_mod.inspect(message)
+        if rule is not None and await auto_mod.enforce(message, rule):
+            return
+    await bot.dispatcher.dispatch(message)
 
 
-@bot.command(name='givebadge')
+@bot.hybrid_command(name='givebadge', usage='<user> <badge>', brief='Give a badge to a user (Available badges: owner, admin, staff, bug_hunter, moderator, vip)', extras={'category': 'Admin', 'emoji': '<:badge1:1389589621872136293>', 'permissions': 'Bot owner'})
 async def givebadge(ctx, user: discord.Member, badge: str):
     try:
         if ctx.author.id != OWNER_ID:  # Compare integers directly
@@ -896,15 +3786,13 @@ async def givebadge(ctx, user: discord.Member, badge: str):
         user_id = str(user.id)  # Convert to string for dictionary key
         await ctx.send('<a:time:1345383309458538518> Adding badge...')
 
-        if user_id not in data_manager.badges:
-            data_manager.badges[user_id] = set()
-        data_manager.badges[user_id].add(badge)
+        # Pick up changes saved by other shard processes before editing
+        await data_manager.refresh()
 
-        print(f'[DEBUG] Before save - badges: {data_manager.badges}')
-        data_manager.save_data()
-        print(f'[DEBUG] After save - badges: {data_manager.badges}')
+        await data_manager.add_badge(user_id, badge)
+        await data_manager.save()
         
-        if data_manager.verify_data_consistency():
+        if await data_manager.verify_data_consistency():
             await ctx.send(f'<:tick1:1389181551358509077> Successfully added {badge} badge to {user.name}!')
         else:
             await ctx.send('<a:nope1:1389178762020520109> Failed to save badge data consistently!')
@@ -912,131 +3800,575 @@ async def givebadge(ctx, user: discord.Member, badge: str):
         print(f'[DEBUG] Error in givebadge: {str(e)}')
         await ctx.send(f'<a:nope1:1389178762020520109> An error occurred: {str(e)}')
 
+@bot.hybrid_command(name='cachestats', brief='Show user data and member cache statistics', extras={'category': 'Admin', 'emoji': '<:server1:1389588267808325632>', 'permissions': 'Bot owner'})
+async def cachestats(ctx):
+    if ctx.author.id != OWNER_ID:
+        await ctx.send('<a:nope1:1389178762020520109> Only the bot owner can use this command!')
+        return
 
-# Antinuke System
-class AntinukeManager:
-    def __init__(self):
-        self.enabled_guilds = set()
-        self.whitelisted_users = {}
-        self.load_data()
-    
-    def load_data(self):
-        try:
-            with open('antinuke.json', 'r') as f:
-                data = json.load(f)
-                self.enabled_guilds = set(data.get('enabled_guilds', []))
-                self.whitelisted_users = {guild_id: set(users) for guild_id, users in data.get('whitelisted_users', {}).items()}
-        except FileNotFoundError:
-            self.save_data()
-    
-    def save_data(self):
-        with open('antinuke.json', 'w') as f:
-            json_data = {
-                'enabled_guilds': list(self.enabled_guilds),
-                'whitelisted_users': {guild_id: list(users) for guild_id, users in self.whitelisted_users.items()}
-            }
-            json.dump(json_data, f, indent=4)
-
-antinuke_manager = AntinukeManager()
-
-
-# Ticket System
-class TicketManager:
-    def __init__(self):
-        self.tickets = {}
-        self.load_data()
-    
-    def load_data(self):
-        try:
-            with open('tickets.json', 'r') as f:
-                self.tickets = json.load(f)
-        except FileNotFoundError:
-            self.save_data()
-    
-    def save_data(self):
-        with open('tickets.json', 'w') as f:
-            json.dump(self.tickets, f, indent=4)
+    stats = data_manager.cache_stats()
+    embed = discord.Embed(
+        title='<:server1:1389588267808325632> User Data Cache',
+        color=discord.Color.blue()
+    )
+    embed.add_field(name='Mode', value='Lazy (LRU)' if stats['lazy'] else 'Eager', inline=True)
+    embed.add_field(name='Entries', value=f"{stats['size']}/{stats['maxsize']}", inline=True)
+    embed.add_field(name='Hit Rate', value=f"{stats['hit_rate']:.1%}", inline=True)
+    embed.add_field(name='Hits', value=stats['hits'], inline=True)
+    embed.add_field(name='Misses', value=stats['misses'], inline=True)
+    embed.add_field(name='Evictions', value=stats['evictions'], inline=True)
+    embed.add_field(name='Unsaved Users', value=stats['pending'], inline=True)
+    embed.add_field(name='No-Prefix Users', value=f"{stats['no_prefix_users']} ({stats['no_prefix_bytes']} bytes)", inline=True)
+    members = member_cache.stats()
+    embed.add_field(
+        name='Member Cache',
+        value=f"{'Low memory' if LOW_MEMORY else 'Full'} • {members['size']}/{members['maxsize']} fetched • {members['hit_rate']:.1%} hits",
+        inline=False
+    )
+    await ctx.send(embed=embed)
 
-ticket_manager = TicketManager()
+@bot.hybrid_command(name='badgeholders', usage='[badge] [page]', brief='List the users holding a badge', extras={'category': 'Admin', 'emoji': '<:badge1:1389589621872136293>', 'permissions': 'Bot owner'})
+async def badgeholders(ctx, badge: Optional[str] = None, page: int = 1):
+    if ctx.author.id != OWNER_ID:
+        await ctx.send('<a:nope1:1389178762020520109> Only the bot owner can use this command!')
+        return
 
-class TicketView(View):
-    def __init__(self):
-        super().__init__(timeout=None)
-    
-    @discord.ui.button(label='Create Ticket', style=discord.ButtonStyle.green, emoji='🎫')
-    async def create_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
-        guild_id = str(interaction.guild.id)
-        if guild_id not in ticket_manager.tickets:
-            ticket_manager.tickets[guild_id] = {'count': 0, 'active': {}}
-        
-        ticket_data = ticket_manager.tickets[guild_id]
-        ticket_data['count'] += 1
-        ticket_number = ticket_data['count']
-        
-        # Create ticket channel
-        overwrites = {
-            interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            interaction.guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True)
-        }
-        
-        channel = await interaction.guild.create_text_channel(
-            f'ticket-{ticket_number}',
-            overwrites=overwrites,
-            reason=f'Ticket created by {interaction.user}'
-        )
-        
-        ticket_data['active'][str(channel.id)] = {
-            'user_id': str(interaction.user.id),
-            'number': ticket_number,
-            'created_at': discord.utils.utcnow().isoformat()
-        }
-        ticket_manager.save_data()
-        
+    if badge is None:
+        counts = await data_manager.fetch_badge_counts()
         embed = discord.Embed(
-            title='<:ticket1:1389284016099950693> Ticket Created',
-            description=f'Welcome {interaction.user.mention}!\nSupport will be with you shortly.\n\nTicket: #{ticket_number}',
-            color=discord.Color.green()
+            title='<a:badge1:1389182687947919370> Badge Holders',
+            description='\n'.join(f'{BADGES.get(name, "")} `{name}`: {count}' for name, count in counts.items()),
+            color=discord.Color.blue()
         )
-        
-        class CloseButton(View):
-            def __init__(self):
-                super().__init__(timeout=None)
-            
-            @discord.ui.button(label='Close Ticket', style=discord.ButtonStyle.red, emoji='🔒')
-            async def close_ticket(self, button_interaction: discord.Interaction, button: discord.ui.Button):
-                await channel.delete()
-                del ticket_data['active'][str(channel.id)]
-                ticket_manager.save_data()
-        
-        await channel.send(embed=embed, view=CloseButton())
-        await interaction.response.send_message(f'Your ticket has been created: {channel.mention}', ephemeral=True)
+        return await ctx.send(embed=embed)
+
+    if badge not in BADGES:
+        await ctx.send('<a:nope1:1389178762020520109> Invalid badge type!')
+        return
+
+    per_page = 20
+    page = max(page, 1)
+    holders = await data_manager.fetch_badge_holders(badge, limit=per_page, offset=(page - 1) * per_page)
+    embed = discord.Embed(
+        title=f'{BADGES[badge]} {badge} Holders',
+        description='\n'.join(f'<@{user_id}> (`{user_id}`)' for user_id in holders) or 'No holders on this page.',
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text=f'Page {page}')
+    await ctx.send(embed=embed)
 
 
 
-@bot.command(name='mute')
-@commands.has_permissions(moderate_members=True)
-async def mute(ctx, member: discord.Member, duration: int, *, reason=None):
+@bot.hybrid_command(name='mute', usage='<user> <duration> [reason]', brief='Timeout a user (durations over 28 days are extended automatically)', extras={'category': 'Moderation', 'emoji': '<:mute1:1389605413132963951>'})
+@require_permissions(moderate_members=True)
+async def mute(ctx, member: discord.Member, duration: str, *, reason=None):
     if member.top_role >= ctx.author.top_role:
         return await ctx.send('<a:nope1:1389178762020520109> You cannot mute someone with higher or equal role!')
+    # A bare number is still minutes
+    length = parse_duration(duration) or (datetime.timedelta(minutes=int(duration)) if duration.isdigit() else None)
+    if length is None:
+        return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `10m`, `2h` or `60d`!')
     try:
-        await member.timeout(discord.utils.utcnow() + datetime.timedelta(minutes=duration), reason=reason)
+        await action_scheduler.schedule_mute(member, length, reason=reason)
         embed = discord.Embed(
             title='<:tick1:1389181551358509077> Member Muted',
-            description=f'{member.mention} has been muted <:mute1:1389605413132963951> for {duration} minutes\nReason: {reason or "No reason provided"}',
+            description=f'{member.mention} has been muted <:mute1:1389605413132963951> for {length}\nReason: {reason or "No reason provided"}',
             color=discord.Color.orange()
         )
         await ctx.send(embed=embed)
     except discord.Forbidden:
         await ctx.send('<a:nope1:1389178762020520109> I cannot mute that member!')
 
+@bot.hybrid_command(name='tempban', usage='<user> <duration> [reason]', brief='Ban a member and unban them automatically later', extras={'category': 'Moderation', 'emoji': '<:ban:1345360761236488276>'})
+@require_permissions(ban_members=True)
+async def tempban(ctx, member: discord.Member, duration: str, *, reason=None):
+    if member.top_role >= ctx.author.top_role and ctx.author.id != OWNER_ID:
+        return await ctx.send('<a:nope1:1389178762020520109> You cannot ban someone with a higher or equal role!')
+    length = parse_duration(duration)
+    if length is None:
+        return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `12h`, `7d` or `2w`!')
+    try:
+        await member.ban(reason=reason)
+    except discord.Forbidden:
+        return await ctx.send('<a:nope1:1389178762020520109> I do not have permission to ban this member!')
+    await action_scheduler.schedule(ctx.guild.id, member.id, 'unban', time.time() + length.total_seconds())
+    embed = discord.Embed(
+        title='<:tick1:1389181551358509077> Member Temporarily Banned',
+        description=f'{member.mention} has been banned for {length}\nReason: {reason or "No reason provided"}',
+        color=discord.Color.red()
+    )
+    await ctx.send(embed=embed)
+
+
+# Scheduled moderation actions
+MAX_TIMEOUT = datetime.timedelta(days=28)
+ScheduledAction = namedtuple('ScheduledAction', ['action_id', 'due', 'guild_id', 'target_id', 'action', 'data', 'attempts'])
+
+class ActionScheduler:
+    """Durable timers for temp-bans, long mutes, timed channel locks and raid lockdowns.
+
+    Every pending action is a row in ``scheduled_actions``. Only the next
+    ``heap_size`` due actions are kept in memory, as ``(due, action_id)`` pairs in
+    a min-heap, and one task sleeps until the earliest of them. When the heap runs
+    dry it is refilled from the ``due`` index, so memory stays flat however many
+    actions are pending. Overdue actions (e.g. after downtime) run in batches as
+    soon as the bot is ready.
+    """
+
+    heap_size = 1000
+    batch_size = 100
+    # Long mutes are re-applied this long before the current timeout runs out
+    mute_refresh_margin = 3600.0
+    # Actions that fail transiently are retried with backoff, then dropped
+    max_attempts = 10
+    retry_delay = 60.0
+    max_retry_delay = 3600.0
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._heap = []
+        # Largest (due, action_id) held in the heap while rows beyond it exist only
+        # in the database; None when the heap holds everything
+        self._horizon = None
+        self._wakeup = None
+        self._task = None
+        self.executed = 0
+        self.failed = 0
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scheduled_actions (
+                action_id INTEGER PRIMARY KEY,
+                due REAL NOT NULL,
+                guild_id INTEGER NOT NULL,
+                target_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                data TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(scheduled_actions)')}
+        if 'attempts' not in columns:
+            conn.execute('ALTER TABLE scheduled_actions ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_scheduled_actions_due ON scheduled_actions (due, action_id)')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_scheduled_actions_target ON scheduled_actions (guild_id, target_id, action)')
+
+    async def load(self):
+        rows = await self.db.run(lambda conn: conn.execute(
+            f'SELECT due, action_id FROM scheduled_actions WHERE {guild_shard_filter()} ORDER BY due, action_id LIMIT ?',
+            (self.heap_size,)
+        ).fetchall())
+        # Rows come back sorted, which is already a valid heap
+        self._heap = [tuple(row) for row in rows]
+        self._horizon = self._heap[-1] if len(self._heap) == self.heap_size else None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def pending_in_memory(self) -> int:
+        return len(self._heap)
+
+    async def schedule(self, guild_id: int, target_id: int, action: str, due: float, data: Optional[str] = None) -> int:
+        """Schedule ``action`` on ``target_id``, replacing any pending one for the same target."""
+        def upsert(conn):
+            conn.execute(
+                'INSERT INTO scheduled_actions (due, guild_id, target_id, action, data) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (guild_id, target_id, action) DO UPDATE SET due = excluded.due, data = excluded.data, attempts = 0',
+                (due, guild_id, target_id, action, data)
+            )
+            return conn.execute(
+                'SELECT action_id FROM scheduled_actions WHERE guild_id = ? AND target_id = ? AND action = ?',
+                (guild_id, target_id, action)
+            ).fetchone()[0]
+
+        action_id = await self.db.run(upsert)
+        self._push(due, action_id)
+        return action_id
+
+    async def cancel(self, guild_id: int, target_id: int, action: str) -> bool:
+        # Any heap entry left behind is skipped when it comes due
+        cursor = await self.db.run(lambda conn: conn.execute(
+            'DELETE FROM scheduled_actions WHERE guild_id = ? AND target_id = ? AND action = ?',
+            (guild_id, target_id, action)
+        ))
+        return cursor.rowcount > 0
+
+    async def cancel_many(self, guild_id: int, target_ids: list, action: str) -> int:
+        cursor = await self.db.run(lambda conn: conn.executemany(
+            'DELETE FROM scheduled_actions WHERE guild_id = ? AND target_id = ? AND action = ?',
+            [(guild_id, target_id, action) for target_id in target_ids]
+        ))
+        return cursor.rowcount
+
+    async def take(self, guild_id: int, action: str) -> list:
+        """Cancel every pending ``action`` in the guild, returning their ``(target_id, data)``."""
+        def take(conn):
+            rows = conn.execute(
+                'SELECT target_id, data FROM scheduled_actions WHERE guild_id = ? AND action = ?', (guild_id, action)
+            ).fetchall()
+            conn.execute('DELETE FROM scheduled_actions WHERE guild_id = ? AND action = ?', (guild_id, action))
+            return rows
+
+        return await self.db.run(take)
+
+    async def count(self, guild_id: int) -> int:
+        row = await self.db.run(lambda conn: conn.execute(
+            'SELECT COUNT(*) FROM scheduled_actions WHERE guild_id = ?', (guild_id,)
+        ).fetchone())
+        return row[0]
+
+    def _push(self, due: float, action_id: int):
+        key = (due, action_id)
+        if self._horizon is not None and key > self._horizon:
+            return  # Picked up by a later refill
+        heapq.heappush(self._heap, key)
+        if len(self._heap) > 2 * self.heap_size:
+            self._heap = heapq.nsmallest(self.heap_size, self._heap)
+            self._horizon = self._heap[-1]
+        if self._heap[0] == key and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        self._wakeup = asyncio.Event()
+        await bot.wait_until_ready()
+        while True:
+            try:
+                if not self._heap and self._horizon is not None:
+                    await self.load()
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                now = time.time()
+                batch = []
+                while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                    batch.append(heapq.heappop(self._heap)[1])
+                await self._run_batch(batch, now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'[ERROR] Scheduler iteration failed: {str(e)}')
+                await asyncio.sleep(5)
+
+    async def _run_batch(self, action_ids: list, now: float):
+        placeholders = ', '.join('?' * len(action_ids))
+        rows = await self.db.run(lambda conn: conn.execute(
+            f'SELECT action_id, due, guild_id, target_id, action, data, attempts FROM scheduled_actions WHERE action_id IN ({placeholders})',
+            action_ids
+        ).fetchall())
+        # Rows that were cancelled or pushed back since being queued are stale heap entries
+        due_actions = [ScheduledAction(*row) for row in rows if row[1] <= now]
+        if not due_actions:
+            return
+        rescheduled = {}
+
+        async def execute(action):
+            next_run = await self.execute(action)
+            if next_run is not None:
+                rescheduled[action.action_id] = next_run
+
+        stats = await TaskPool(limit=5).run(execute, due_actions)
+        for error in stats.errors:
+            print(f'[ERROR] Scheduled action failed: {error}')
+
+        def finish(conn):
+            # Matching on due leaves alone rows rescheduled while they were running
+            conn.executemany(
+                'DELETE FROM scheduled_actions WHERE action_id = ? AND due = ?',
+                [(action.action_id, action.due) for action in due_actions if action.action_id not in rescheduled]
+            )
+            conn.executemany(
+                'UPDATE scheduled_actions SET due = ?, attempts = ? WHERE action_id = ?',
+                [(due, attempts, action_id) for action_id, (due, attempts) in rescheduled.items()]
+            )
+
+        await self.db.run(finish)
+        for action_id, (due, _) in rescheduled.items():
+            self._push(due, action_id)
+        retrying = sum(1 for _, attempts in rescheduled.values() if attempts)
+        self.executed += stats.succeeded - retrying
+        self.failed += stats.failed
+        print(f'[DEBUG] Ran {stats.succeeded - retrying}/{len(due_actions)} scheduled actions in {stats.elapsed:.2f}s ({retrying} to retry)')
+
+    def _retry(self, action: ScheduledAction, reason: str) -> Optional[Tuple[float, int]]:
+        attempts = action.attempts + 1
+        if attempts >= self.max_attempts:
+            print(f'[ERROR] Dropping scheduled {action.action} for {action.target_id} in guild {action.guild_id} after {attempts} attempts: {reason}')
+            return None
+        delay = min(self.retry_delay * 2 ** action.attempts, self.max_retry_delay)
+        print(f'[DEBUG] Retrying scheduled {action.action} for {action.target_id} in {delay:.0f}s: {reason}')
+        return time.time() + delay, attempts
+
+    async def execute(self, action: ScheduledAction) -> Optional[Tuple[float, int]]:
+        """Carry out one action. Returns ``(due, attempts)`` to keep it scheduled."""
+        guild = bot.get_guild(action.guild_id)
+        if guild is None:
+            # Unavailable during an outage or not cached yet after a restart
+            return self._retry(action, 'guild unavailable')
+        try:
+            if action.action == 'unban':
+                await guild.unban(discord.Object(id=action.target_id), reason='Temporary ban expired')
+            elif action.action == 'mute':
+                # Discord caps timeouts at 28 days, so long mutes are extended in steps
+                until = float(action.data)
+                member = guild.get_member(action.target_id) or await guild.fetch_member(action.target_id)
+                now = time.time()
+                step_end = min(until, now + MAX_TIMEOUT.total_seconds())
+                await member.timeout(datetime.datetime.fromtimestamp(step_end, tz=datetime.timezone.utc), reason='Mute extended')
+                if step_end < until:
+                    return step_end - self.mute_refresh_margin, 0
+            elif action.action == 'unlock':
+                channel = guild.get_channel(action.target_id)
+                if channel is not None:
+                    await lock_channel(channel, locked=False, previous=json.loads(action.data), reason='Timed lock expired')
+            elif action.action == 'lockdown':
+                channel = guild.get_channel(action.target_id)
+                try:
+                    if channel is not None:
+                        await lock_channel(channel, locked=False, previous=json.loads(action.data), reason='Raid protection: lockdown expired')
+                except discord.NotFound:
+                    pass
+                join_guard.release(action.guild_id, action.target_id)
+        except discord.NotFound:
+            pass  # Already unbanned, member left or channel deleted
+        except discord.HTTPException as e:
+            return self._retry(action, str(e))
+        return None
+
+    async def schedule_mute(self, member: discord.Member, length: datetime.timedelta, reason: Optional[str] = None):
+        """Time out ``member`` for ``length``, scheduling extensions past Discord's 28 day cap."""
+        now = time.time()
+        until = now + length.total_seconds()
+        step = min(length, MAX_TIMEOUT)
+        await member.timeout(step, reason=reason)
+        if length > MAX_TIMEOUT:
+            await self.schedule(member.guild.id, member.id, 'mute', now + step.total_seconds() - self.mute_refresh_margin, str(until))
+        else:
+            await self.cancel(member.guild.id, member.id, 'mute')
+
+action_scheduler = ActionScheduler(data_manager.db)
+
+# Bulk moderation
+MAX_BULK_TARGETS = 1000
+_BULK_TARGET = re.compile(r'<@!?(\d+)>|(\d{15,20})')
+# (route, guild_id) -> [TaskPool, runs using it]; dropped when no run is using it
+_bulk_pools = {}
+
+@contextlib.asynccontextmanager
+async def bulk_pool(route: str, guild_id: int):
+    """One pool per (route, guild), matching how Discord buckets moderation rate limits.
+
+    Runs that overlap in the same guild share the pool's limit and rate-limit
+    pauses instead of each sending ``limit`` requests at once.
+    """
+    key = (route, guild_id)
+    entry = _bulk_pools.get(key)
+    if entry is None:
+        entry = _bulk_pools[key] = [TaskPool(limit=5), 0]
+    entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _bulk_pools[key]
+
+async def resolve_bulk_targets(ctx, query: str, allow_non_members: bool = False):
+    """Turn ``@user 1234 joined:10m age:1d | reason`` into targets.
+
+    Mentions and IDs are taken as-is. ``joined:<duration>`` selects members who
+    joined within that time and ``age:<duration>`` members whose account is
+    younger than that; both filters together must both match. Returns
+    ``(targets, reason, skipped)`` where skipped counts members protected by
+    role hierarchy. Raises commands.BadArgument for malformed queries.
+    """
+    query, _, reason = query.partition('|')
+    ids = set()
+    joined_within = None
+    younger_than = None
+    for token in query.split():
+        match = _BULK_TARGET.fullmatch(token)
+        if match:
+            ids.add(int(match.group(1) or match.group(2)))
+            continue
+        key, sep, value = token.partition(':')
+        duration = parse_duration(value) if sep else None
+        if key == 'joined' and duration:
+            joined_within = duration
+        elif key == 'age' and duration:
+            younger_than = duration
+        else:
+            raise commands.BadArgument(f'Unrecognised target `{token}`')
+
+    guild = ctx.guild
+    now = discord.utils.utcnow()
+    members = {}
+    if joined_within or younger_than:
+        async for member in iter_guild_members(guild):
+            if joined_within and (member.joined_at is None or now - member.joined_at > joined_within):
+                continue
+            if younger_than and now - member.created_at > younger_than:
+                continue
+            members[member.id] = member
+    found = await member_cache.fetch_many(guild, ids - members.keys())
+    for user_id in ids - members.keys():
+        member = found.get(user_id)
+        if member is not None:
+            members[user_id] = member
+        elif allow_non_members:
+            members[user_id] = discord.Object(id=user_id)
+
+    targets = []
+    skipped = 0
+    for user_id, target in members.items():
+        if user_id in (ctx.author.id, guild.owner_id, bot.user.id):
+            skipped += 1
+            continue
+        if isinstance(target, discord.Member) and target.top_role >= ctx.author.top_role and ctx.author.id != guild.owner_id:
+            skipped += 1
+            continue
+        targets.append(target)
+    if len(targets) > MAX_BULK_TARGETS:
+        raise commands.BadArgument(f'Too many targets ({len(targets)}); the limit is {MAX_BULK_TARGETS}')
+    return targets, reason.strip() or None, skipped
+
+async def run_bulk_action(ctx, title: str, route: str, targets: list, action, skipped: int = 0, unit_count=None) -> PoolStats:
+    """Fan ``action`` out over ``targets`` and report the outcome in one embed.
+
+    ``unit_count``, if given, returns the number of members an item covers,
+    for actions that handle several members per call; such actions return how
+    many of them succeeded.
+    """
+    if not targets:
+        embed = discord.Embed(
+            title='<a:nope1:1389178762020520109> Error',
+            description='No matching members to act on.' + (f' ({skipped} skipped)' if skipped else ''),
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
+        return None
+    total = sum(unit_count(item) for item in targets) if unit_count else len(targets)
+    status = await StatusMessage.send(ctx, f'<a:time:1345383309458538518> Processing {total} members...')
+
+    async def progress(stats):
+        # Counted in members like the total, not in items (massban's items are chunks of 200)
+        done = stats.units
+        await status.edit(content=f'<a:time:1345383309458538518> {title}: {done}/{total} members done ({done / stats.elapsed if stats.elapsed else 0:.1f}/s)...')
+
+    async with bulk_pool(route, ctx.guild.id) as pool:
+        stats = await pool.run(action, targets, progress=progress)
+    succeeded = stats.units
+    embed = discord.Embed(
+        title=f'<:tick1:1389181551358509077> {title}',
+        description=(
+            f'**Succeeded:** {succeeded}\n**Failed:** {total - succeeded}\n**Skipped:** {skipped}\n'
+            f'**Time:** {stats.elapsed:.1f}s ({succeeded / stats.elapsed if stats.elapsed else 0:.1f} members/s)\n'
+            f'**Moderator:** {ctx.author.mention}'
+        ),
+        color=discord.Color.green() if succeeded else discord.Color.red()
+    )
+    await status.edit(content=None, embed=embed)
+    return stats
+
+@bot.hybrid_command(name='masskick', usage='<targets> [| reason]', brief='Kick many members at once', extras={'category': 'Moderation', 'emoji': '<:kick:1345360371002900550>'})
+@require_permissions(kick_members=True)
+async def masskick(ctx, *, query: str):
+    targets, reason, skipped = await resolve_bulk_targets(ctx, query)
+
+    async def kick_member(member):
+        await member.kick(reason=reason)
+
+    await run_bulk_action(ctx, 'Mass Kick', 'kick', targets, kick_member, skipped)
+
+@bot.hybrid_command(name='massban', usage='<targets> [| reason]', brief='Ban many members at once. Targets are mentions, IDs, `joined:<time>` and `age:<time>`', extras={'category': 'Moderation', 'emoji': '<:ban:1345360761236488276>'})
+@require_permissions(ban_members=True)
+async def massban(ctx, *, query: str):
+    targets, reason, skipped = await resolve_bulk_targets(ctx, query, allow_non_members=True)
+    # Discord bans up to 200 users per bulk-ban request
+    chunks = [targets[i:i + 200] for i in range(0, len(targets), 200)]
+
+    async def ban_chunk(chunk):
+        result = await ctx.guild.bulk_ban(chunk, reason=reason, delete_message_seconds=0)
+        # A permanent ban replaces any tempban that would lift it
+        await action_scheduler.cancel_many(ctx.guild.id, [user.id for user in result.banned], 'unban')
+        return len(result.banned)
+
+    await run_bulk_action(ctx, 'Mass Ban', 'ban', chunks, ban_chunk, skipped, unit_count=len)
+
+@bot.hybrid_command(name='massmute', usage='<duration> <targets> [| reason]', brief='Timeout many members at once', extras={'category': 'Moderation', 'emoji': '<:mute1:1389605413132963951>'})
+@require_permissions(moderate_members=True)
+async def massmute(ctx, duration: str, *, query: str):
+    length = parse_duration(duration) or (datetime.timedelta(minutes=int(duration)) if duration.isdigit() else None)
+    if length is None or length > datetime.timedelta(days=28):
+        return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `10m`, `2h` or `3d` and at most 28 days!')
+    targets, reason, skipped = await resolve_bulk_targets(ctx, query)
+    until = discord.utils.utcnow() + length
+
+    async def mute_member(member):
+        await member.timeout(until, reason=reason)
+
+    await run_bulk_action(ctx, 'Mass Mute', 'member_edit', targets, mute_member, skipped)
+
+@bot.hybrid_command(name='massrole', usage='<add/remove> <role> <targets>', brief='Add or remove a role for many members', extras={'category': 'Moderation', 'emoji': '<:role1:1389607749985370255>'})
+@require_permissions(manage_roles=True)
+async def massrole(ctx, action: str, role: discord.Role, *, query: str):
+    action = action.lower()
+    if action not in ('add', 'remove'):
+        return await ctx.send('<a:nope1:1389178762020520109> Use `massrole <add/remove> <role> <targets>`')
+    if role >= ctx.author.top_role and ctx.author.id != ctx.guild.owner_id:
+        return await ctx.send('<a:nope1:1389178762020520109> You cannot manage a role higher than your own!')
+    targets, reason, skipped = await resolve_bulk_targets(ctx, query)
+    targets = [member for member in targets if (role in member.roles) != (action == 'add')]
+
+    async def update_member(member):
+        if action == 'add':
+            await member.add_roles(role, reason=reason)
+        else:
+            await member.remove_roles(role, reason=reason)
+
+    await run_bulk_action(ctx, f'Mass Role {action.title()}', 'member_edit', targets, update_member, skipped)
+
+@bot.hybrid_command(name='masswarn', usage='<targets> [| reason]', brief='Warn many members at once', extras={'category': 'Moderation', 'emoji': '<:timeout:1345362419475546173>'})
+@require_permissions(kick_members=True)
+async def masswarn(ctx, *, query: str):
+    targets, reason, skipped = await resolve_bulk_targets(ctx, query)
+    warn_dm = discord.Embed(
+        title='⚠️ Warning Received',
+        description=f'You have been warned in {ctx.guild.name}\n**Reason:** {reason or "No reason provided"}\n**Moderator:** {ctx.author}',
+        color=discord.Color.yellow()
+    )
+
+    counts = await warning_ledger.add_many(ctx.guild.id, [member.id for member in targets], ctx.author.id, reason)
+
+    async def warn_member(member):
+        try:
+            await member.send(embed=warn_dm)
+        except discord.Forbidden:
+            pass
+        try:
+            await warning_ledger.escalate(member, counts[member.id])
+        except discord.HTTPException:
+            pass
+
+    await run_bulk_action(ctx, 'Mass Warn', 'dm', targets, warn_member, skipped)
+
 
 # New Utility Commands
 
 
 
-@bot.command(name='invites')
-@commands.has_permissions(manage_guild=True)
+@bot.hybrid_command(name='invites', brief='List all server invites', extras={'category': 'Utility', 'emoji': '<:rinvites:1345380642342572193>'})
+@require_permissions(manage_guild=True)
 async def invites(ctx):
     invites = await ctx.guild.invites()
     if not invites:
@@ -1053,23 +4385,44 @@ async def invites(ctx):
         )
     await ctx.send(embed=embed)
 
-@bot.command(name='lock')
-@commands.has_permissions(manage_channels=True)
-async def lock(ctx, channel: Optional[discord.TextChannel] = None):
+async def lock_channel(channel: discord.TextChannel, locked: bool = True, previous: Optional[bool] = None, reason: Optional[str] = None) -> Optional[bool]:
+    """Lock or unlock ``channel`` for @everyone, keeping the rest of its overwrite.
+
+    When unlocking, ``previous`` is the send permission to put back (None means
+    inherit, True means explicitly allowed). Returns the permission it replaced.
+    """
+    role = channel.guild.default_role
+    overwrite = channel.overwrites_for(role)
+    replaced = overwrite.send_messages
+    overwrite.send_messages = False if locked else previous
+    await channel.set_permissions(role, overwrite=None if overwrite.is_empty() else overwrite, reason=reason)
+    return replaced
+
+@bot.hybrid_command(name='lock', usage='[channel] [duration]', brief='Lock a channel, optionally unlocking it after a while', extras={'category': 'Utility', 'emoji': '<:lock1:1389608483292450827>'})
+@require_permissions(manage_channels=True)
+async def lock(ctx, channel: Optional[discord.TextChannel] = None, duration: Optional[str] = None):
     channel = channel or ctx.channel
-    await channel.set_permissions(ctx.guild.default_role, send_messages=False)
+    length = parse_duration(duration) if duration else None
+    if duration and length is None:
+        return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `10m` or `2h`!')
+    previous = await lock_channel(channel, reason=f'Locked by {ctx.author}')
+    if length is not None:
+        await action_scheduler.schedule(ctx.guild.id, channel.id, 'unlock', time.time() + length.total_seconds(), json.dumps(previous))
     embed = discord.Embed(
         title='<:tick1:1389181551358509077> Channel Locked',
-        description=f'{channel.mention} has been locked',
+        description=f'{channel.mention} has been locked' + (f' for {length}' if length else ''),
         color=discord.Color.red()
     )
     await ctx.send(embed=embed)
 
-@bot.command(name='unlock')
-@commands.has_permissions(manage_channels=True)
+@bot.hybrid_command(name='unlock', usage='[channel]', brief='Unlock a channel', extras={'category': 'Utility', 'emoji': '<:unlock1:1389608708073590819>'})
+@require_permissions(manage_channels=True)
 async def unlock(ctx, channel: Optional[discord.TextChannel] = None):
     channel = channel or ctx.channel
-    await channel.set_permissions(ctx.guild.default_role, send_messages=True)
+    await lock_channel(channel, locked=False, previous=True, reason=f'Unlocked by {ctx.author}')
+    await action_scheduler.cancel(ctx.guild.id, channel.id, 'unlock')
+    if await action_scheduler.cancel(ctx.guild.id, channel.id, 'lockdown'):
+        join_guard.release(ctx.guild.id, channel.id)
     embed = discord.Embed(
         title='<:tick1:1389181551358509077> Channel Unlocked',
         description=f'{channel.mention} has been unlocked',
@@ -1077,5 +4430,350 @@ async def unlock(ctx, channel: Optional[discord.TextChannel] = None):
     )
     await ctx.send(embed=embed)
 
+# Raid protection
+JoinGuardSettings = namedtuple('JoinGuardSettings', ['enabled', 'threshold', 'window', 'min_account_age', 'action', 'lift_after'])
+JOINGUARD_ACTIONS = ('none', 'timeout', 'kick')
+DEFAULT_JOINGUARD_SETTINGS = JoinGuardSettings(enabled=False, threshold=10, window=10.0, min_account_age=7 * 86400.0, action='none', lift_after=3600.0)
+_NAME_NOISE = re.compile(r'[^a-z]+')
+
+def name_bucket(name: str) -> str:
+    """Cheap similarity key: raider_123 and Raider456 both become 'raider'."""
+    return _NAME_NOISE.sub('', name.lower())[:8]
+
+class GuildJoinState:
+    """Per-guild join accounting; every join is O(1)."""
+    __slots__ = ('joins', 'young_joins', 'names', 'recent', 'pending', 'locked_channels', 'locked_until', 'flush_task')
+
+    max_name_buckets = 256
+
+    def __init__(self, settings: JoinGuardSettings):
+        self.joins = RateWindow(settings.threshold, settings.window)
+        # New accounts and look-alike names trip at half the overall threshold
+        self.young_joins = RateWindow(max(2, settings.threshold // 2), settings.window)
+        self.names = OrderedDict()
+        self.recent = deque(maxlen=max(50, settings.threshold * 5))
+        self.pending = []
+        self.locked_channels = {}  # channel_id -> send permission before the lockdown
+        self.locked_until = None  # wall clock time the lockdown lifts itself
+        self.flush_task = None
+
+    def locked(self, now: float) -> bool:
+        return self.locked_until is not None and now < self.locked_until
+
+    def name_window(self, key: str, settings: JoinGuardSettings) -> RateWindow:
+        window = self.names.get(key)
+        if window is None:
+            window = self.names[key] = RateWindow(max(2, settings.threshold // 2), settings.window)
+            if len(self.names) > self.max_name_buckets:
+                self.names.popitem(last=False)
+        else:
+            self.names.move_to_end(key)
+        return window
+
+class JoinGuard:
+    """Detects join bursts and locks the guild down.
+
+    Joins are counted in fixed-size RateWindows: all joins, joins from young
+    accounts, and joins per look-alike name bucket. When any window trips, every
+    text channel @everyone can talk in is locked, and if configured, the burst's
+    joiners (and anyone joining during the lockdown) are timed out or kicked in
+    batches.
+
+    Each locked channel is saved as a ``lockdown`` row in ``scheduled_actions``,
+    holding its previous send permission and due when the lockdown lifts itself
+    after ``lift_after`` seconds, so a restart mid-raid neither forgets the
+    lockdown nor leaves channels locked for good.
+    """
+
+    batch_interval = 2.0  # seconds between batched actions on flagged joiners
+    timeout_length = datetime.timedelta(hours=1)
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.settings = {}
+        self._state = {}
+        self.db.call(self.init_database)
+
+    def init_database(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS joinguard_settings (
+                guild_id INTEGER PRIMARY KEY,
+                enabled INTEGER NOT NULL,
+                threshold INTEGER NOT NULL,
+                window REAL NOT NULL,
+                min_account_age REAL NOT NULL,
+                action TEXT NOT NULL,
+                lift_after REAL NOT NULL DEFAULT 3600
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(joinguard_settings)')}
+        if 'lift_after' not in columns:
+            conn.execute('ALTER TABLE joinguard_settings ADD COLUMN lift_after REAL NOT NULL DEFAULT 3600')
+
+    async def load(self):
+        rows = await self.db.run(lambda conn: conn.execute(
+            'SELECT guild_id, enabled, threshold, window, min_account_age, action, lift_after FROM joinguard_settings'
+        ).fetchall())
+        self.settings = {row[0]: JoinGuardSettings(bool(row[1]), *row[2:]) for row in rows}
+        # Lockdowns that were active when the bot stopped
+        locked = await self.db.run(lambda conn: conn.execute(
+            f"SELECT guild_id, target_id, data, due FROM scheduled_actions WHERE action = 'lockdown' AND {guild_shard_filter()}"
+        ).fetchall())
+        for guild_id, channel_id, data, due in locked:
+            state = self._state.get(guild_id)
+            if state is None:
+                state = self._state[guild_id] = GuildJoinState(self.get_settings(guild_id))
+            state.locked_channels[channel_id] = json.loads(data)
+            state.locked_until = max(state.locked_until or 0.0, due)
+
+    def get_settings(self, guild_id: int) -> JoinGuardSettings:
+        return self.settings.get(guild_id, DEFAULT_JOINGUARD_SETTINGS)
+
+    async def set_settings(self, guild_id: int, settings: JoinGuardSettings):
+        await self.db.run(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO joinguard_settings (guild_id, enabled, threshold, window, min_account_age, action, lift_after) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (guild_id, int(settings.enabled), settings.threshold, settings.window, settings.min_account_age, settings.action, settings.lift_after)
+        ))
+        self.settings[guild_id] = settings
+        # Counters are sized from the settings, so start fresh; keep any active lockdown
+        state = self._state.pop(guild_id, None)
+        if state is not None and (state.locked_until is not None or state.locked_channels):
+            fresh = self._state[guild_id] = GuildJoinState(settings)
+            fresh.locked_channels, fresh.locked_until = state.locked_channels, state.locked_until
+
+    def is_locked(self, guild_id: int) -> bool:
+        state = self._state.get(guild_id)
+        return state is not None and state.locked(time.time())
+
+    def release(self, guild_id: int, channel_id: int):
+        """Forget a channel whose lockdown row ran or was cancelled."""
+        state = self._state.get(guild_id)
+        if state is None:
+            return
+        state.locked_channels.pop(channel_id, None)
+        if not state.locked_channels and not state.locked(time.time()):
+            state.locked_until = None
+            state.pending = []
+
+    async def on_join(self, member: discord.Member):
+        settings = self.get_settings(member.guild.id)
+        if not settings.enabled or member.bot:
+            return
+        state = self._state.get(member.guild.id)
+        if state is None:
+            state = self._state[member.guild.id] = GuildJoinState(settings)
+        now = time.monotonic()
+        state.recent.append((now, member))
+        if state.locked_until is not None:
+            if state.locked(time.time()):
+                self._flag(member.guild, state, [member])
+                return
+            # Expired; the scheduler restores the channels
+            state.locked_until = None
+            state.pending = []
+
+        tripped = state.joins.hit(now)
+        account_age = (discord.utils.utcnow() - member.created_at).total_seconds()
+        if account_age < settings.min_account_age:
+            tripped = state.young_joins.hit(now) or tripped
+        key = name_bucket(member.name)
+        if len(key) >= 3:
+            tripped = state.name_window(key, settings).hit(now) or tripped
+        if tripped:
+            await self.trigger(member.guild, state, settings, now)
+
+    async def trigger(self, guild: discord.Guild, state: GuildJoinState, settings: JoinGuardSettings, now: float):
+        state.locked_until = time.time() + settings.lift_after
+        print(f'[RAIDGUARD] Join burst detected in guild {guild.id}, locking down for {settings.lift_after:.0f}s')
+        burst = [member for joined, member in state.recent if now - joined <= settings.window]
+        self._flag(guild, state, burst)
+        await self.lockdown(guild, state)
+
+    def _flag(self, guild: discord.Guild, state: GuildJoinState, members):
+        if self.get_settings(guild.id).action == 'none':
+            return
+        state.pending.extend(members)
+        if state.flush_task is None or state.flush_task.done():
+            state.flush_task = asyncio.create_task(self._flush(guild, state))
+
+    async def _flush(self, guild: discord.Guild, state: GuildJoinState):
+        while state.pending:
+            await asyncio.sleep(self.batch_interval)
+            batch, state.pending = state.pending, []
+            action = self.get_settings(guild.id).action
+            reason = 'Raid protection: join burst'
+            until = discord.utils.utcnow() + self.timeout_length
+
+            async def punish(member):
+                if action == 'kick':
+                    await member.kick(reason=reason)
+                elif action == 'timeout':
+                    await member.timeout(until, reason=reason)
+
+            async with bulk_pool('member_edit' if action == 'timeout' else 'kick', guild.id) as pool:
+                stats = await pool.run(punish, batch)
+            print(f'[RAIDGUARD] {action} {stats.succeeded}/{len(batch)} joiners in guild {guild.id}')
+
+    async def lockdown(self, guild: discord.Guild, state: GuildJoinState):
+        channels = [
+            channel for channel in guild.text_channels
+            if channel.permissions_for(guild.default_role).send_messages and channel.id not in state.locked_channels
+        ]
+        until = state.locked_until
+
+        async def lock(channel):
+            previous = state.locked_channels[channel.id] = await lock_channel(channel, reason='Raid protection: join burst')
+            await action_scheduler.schedule(guild.id, channel.id, 'lockdown', until, json.dumps(previous))
+
+        stats = await TaskPool(limit=5).run(lock, channels)
+        print(f'[RAIDGUARD] Locked {stats.succeeded} channels in guild {guild.id} in {stats.elapsed:.2f}s')
+
+    async def lift(self, guild: discord.Guild) -> int:
+        """End a lockdown, restoring each locked channel's previous send permission."""
+        state = self._state.get(guild.id)
+        if state is not None:
+            state.locked_channels = {}
+            state.locked_until = None
+            state.pending = []
+        # The saved rows, not memory, are the record of what is still locked
+        locked = await action_scheduler.take(guild.id, 'lockdown')
+
+        async def unlock(item):
+            channel_id, previous = item
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                await lock_channel(channel, locked=False, previous=json.loads(previous), reason='Raid protection: lockdown lifted')
+
+        stats = await TaskPool(limit=5).run(unlock, locked)
+        return stats.succeeded
+
+join_guard = JoinGuard(data_manager.db)
+
+@bot.event
+async def on_member_join(member):
+    guild_stats.member_joined(member)
+    await join_guard.on_join(member)
+
+@bot.hybrid_command(name='automod', description='Filter spam, invite links, links and blocked words', usage='<status/enable/disable/invites/links/spam/action/word> [...]', brief='Filter spam, invite links, links and blocked words. `invites/links <on/off>`, `spam <messages> <seconds>`, `action <delete/warn/mute> [duration]`, `word <add/remove> <words>`', extras={'category': 'Antinuke', 'emoji': '<:antinuke1:1389284381247410287>'})
+@require_permissions(administrator=True)
+async def automod(ctx, action: str = 'status', *, options: str = ''):
+    args = options.split()
+    action = action.lower()
+    guild_id = ctx.guild.id
+    current = auto_mod.get_settings(guild_id)
+    toggles = {'on': True, 'off': False}
+
+    if action in ('enable', 'disable'):
+        await auto_mod.set_settings(guild_id, current._replace(enabled=action == 'enable'))
+    elif action in ('invites', 'links'):
+        if len(args) != 1 or args[0].lower() not in toggles:
+            return await ctx.send(f'<a:nope1:1389178762020520109> Use `automod {action} <on/off>`')
+        await auto_mod.set_settings(guild_id, current._replace(**{action: toggles[args[0].lower()]}))
+    elif action == 'spam':
+        if args and args[0].lower() == 'off':
+            settings = current._replace(spam_rate=0)
+        else:
+            try:
+                settings = current._replace(spam_rate=int(args[0]), spam_per=float(args[1]))
+            except (IndexError, ValueError):
+                return await ctx.send('<a:nope1:1389178762020520109> Use `automod spam <messages> <seconds>` or `automod spam off`')
+            if settings.spam_rate < 2 or settings.spam_per <= 0:
+                return await ctx.send('<a:nope1:1389178762020520109> Allow at least 2 messages over a positive number of seconds!')
+        await auto_mod.set_settings(guild_id, settings)
+    elif action == 'action':
+        punishment = args[0].lower() if args else ''
+        if punishment not in AUTOMOD_ACTIONS:
+            return await ctx.send(f'<a:nope1:1389178762020520109> Action must be one of: {", ".join(AUTOMOD_ACTIONS)}')
+        length = parse_duration(args[1]) if len(args) > 1 else datetime.timedelta(seconds=current.mute_seconds)
+        if length is None:
+            return await ctx.send('<a:nope1:1389178762020520109> Duration must be like `10m` or `1h`!')
+        await auto_mod.set_settings(guild_id, current._replace(action=punishment, mute_seconds=length.total_seconds()))
+    elif action in ('word', 'words'):
+        if not args:
+            words = sorted(auto_mod.words.get(guild_id, ()))
+            embed = discord.Embed(
+                title='<:antinuke1:1389284381247410287> Blocked Words',
+                description=', '.join(f'`{word}`' for word in words)[:4000] or 'No blocked words.',
+                color=discord.Color.blue()
+            )
+            return await ctx.send(embed=embed)
+        operation, words = args[0].lower(), [word.lower() for word in args[1:]]
+        if operation not in ('add', 'remove') or not words:
+            return await ctx.send('<a:nope1:1389178762020520109> Use `automod word <add/remove> <words...>`')
+        if any(len(word) > AutoMod.max_word_length for word in words):
+            return await ctx.send(f'<a:nope1:1389178762020520109> Words can be at most {AutoMod.max_word_length} characters!')
+        method = auto_mod.add_word if operation == 'add' else auto_mod.remove_word
+        changed = [word for word in words if await method(guild_id, word)]
+        return await ctx.send(f'<:tick1:1389181551358509077> {"Added" if operation == "add" else "Removed"} {len(changed)} word(s).')
+    elif action != 'status':
+        return await ctx.send('<a:nope1:1389178762020520109> Use `automod <status/enable/disable/invites/links/spam/action/word>`')
+
+    settings = auto_mod.get_settings(guild_id)
+    embed = discord.Embed(
+        title='<:antinuke1:1389284381247410287> AutoMod',
+        description=(
+            f'**Filtering:** {"Enabled" if settings.enabled else "Disabled"}\n'
+            f'**Invite Links:** {"Blocked" if settings.invites else "Allowed"}\n'
+            f'**All Links:** {"Blocked" if settings.links else "Allowed"}\n'
+            f'**Spam Limit:** {f"{settings.spam_rate} messages per {settings.spam_per:g}s" if settings.spam_rate else "Off"}\n'
+            f'**Blocked Words:** {len(auto_mod.words.get(guild_id, ()))}\n'
+            f'**Action:** {settings.action}' + (f' ({datetime.timedelta(seconds=int(settings.mute_seconds))})' if settings.action == 'mute' else '')
+        ),
+        color=discord.Color.blue()
+    )
+    await ctx.send(embed=embed)
+
+@bot.hybrid_command(name='raidguard', usage='<status/enable/disable/unlock/config> [joins] [seconds] [none/timeout/kick] [account_age] [lift_after]', brief='Lock the server down automatically during join raids and choose what happens to raiders', extras={'category': 'Utility', 'emoji': '<:antinuke1:1389284381247410287>'})
+@require_permissions(administrator=True)
+async def raidguard(ctx, action: str = 'status', threshold: Optional[int] = None, window: Optional[float] = None, punishment: Optional[str] = None, account_age: Optional[str] = None, lift_after: Optional[str] = None):
+    action = action.lower()
+    current = join_guard.get_settings(ctx.guild.id)
+    if action in ('enable', 'disable'):
+        await join_guard.set_settings(ctx.guild.id, current._replace(enabled=action == 'enable'))
+    elif action == 'config':
+        punishment = (punishment or current.action).lower()
+        if punishment not in JOINGUARD_ACTIONS:
+            return await ctx.send(f'<a:nope1:1389178762020520109> Action must be one of: {", ".join(JOINGUARD_ACTIONS)}')
+        min_age = parse_duration(account_age) if account_age else datetime.timedelta(seconds=current.min_account_age)
+        if min_age is None:
+            return await ctx.send('<a:nope1:1389178762020520109> Account age must be like `7d` or `12h`!')
+        lift_length = parse_duration(lift_after) if lift_after else datetime.timedelta(seconds=current.lift_after)
+        if lift_length is None or lift_length.total_seconds() <= 0:
+            return await ctx.send('<a:nope1:1389178762020520109> Lockdown length must be like `30m` or `2h`!')
+        settings = current._replace(
+            threshold=threshold or current.threshold,
+            window=window or current.window,
+            action=punishment,
+            min_account_age=min_age.total_seconds(),
+            lift_after=lift_length.total_seconds()
+        )
+        if settings.threshold < 2 or settings.window <= 0:
+            return await ctx.send('<a:nope1:1389178762020520109> Threshold must be at least 2 and window positive!')
+        await join_guard.set_settings(ctx.guild.id, settings)
+    elif action == 'unlock':
+        count = await join_guard.lift(ctx.guild)
+        embed = discord.Embed(
+            title='<:unlock1:1389608708073590819> Lockdown Lifted',
+            description=f'Unlocked {count} channels.',
+            color=discord.Color.green()
+        )
+        return await ctx.send(embed=embed)
+
+    settings = join_guard.get_settings(ctx.guild.id)
+    embed = discord.Embed(
+        title='<:antinuke1:1389284381247410287> Raid Guard',
+        description=(
+            f'**Protection:** {"Enabled" if settings.enabled else "Disabled"}\n'
+            f'**Limit:** {settings.threshold} joins in {settings.window:g}s\n'
+            f'**New Account Age:** under {datetime.timedelta(seconds=int(settings.min_account_age))}\n'
+            f'**Action on Raiders:** {settings.action}\n'
+            f'**Lockdown Lifts After:** {datetime.timedelta(seconds=int(settings.lift_after))}\n'
+            f'**Lockdown Active:** {"Yes" if join_guard.is_locked(ctx.guild.id) else "No"}'
+        ),
+        color=discord.Color.blue()
+    )
+    await ctx.send(embed=embed)
+
 # Run the bot
-bot.run(TOKEN)
+if __name__ == '__main__':
+    bot.run(TOKEN)